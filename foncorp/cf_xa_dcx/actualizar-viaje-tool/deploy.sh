@@ -1,3 +1,16 @@
+# Peticiones simultáneas por instancia. Las tools pasan casi todo el tiempo esperando
+# a BigQuery, así que una instancia con varios hilos sustituye a muchas instancias ociosas.
+# THREADS (hilos gthread de functions-framework) debe coincidir con --concurrency.
+CONCURRENCY=${CONCURRENCY:-16}
+# MAX_INSTANCES limita el número de instancias (p.ej. MAX_INSTANCES=1 para bench-concurrency.sh).
+# Vacío = límite por defecto de Cloud Functions.
+# Si PROFILE_TOKEN está definido, la cabecera 'X-Profile-Token: <token>' perfila esa petición
+# y devuelve el perfil en el cuerpo de la respuesta (ver request_profiling.py).
+# Vacío = perfilado por cabecera desactivado. PROFILE_MODE=cprofile solo con CONCURRENCY=1.
+
+# Las copias de los módulos y specs compartidos deben ser idénticas (ver check-shared-copies.sh)
+"$(dirname "$0")/../../check-shared-copies.sh" || exit 1
+
 gcloud functions deploy actualizar-viaje-tool \
 --gen2 \
 --runtime=python312 \
@@ -5,5 +18,8 @@ gcloud functions deploy actualizar-viaje-tool \
 --entry-point=actualizar_viaje_tool_webhook \
 --trigger-http \
 --allow-unauthenticated \
---set-env-vars=BIGQUERY_PROJECT_ID=fon-test-project,BIGQUERY_DATASET_ID=foncorp_travel_data,BIGQUERY_TABLE_ID=travel_requests \
+--cpu=1 \
+--concurrency=${CONCURRENCY} \
+${MAX_INSTANCES:+--max-instances=${MAX_INSTANCES}} \
+--set-env-vars=BIGQUERY_PROJECT_ID=fon-test-project,BIGQUERY_DATASET_ID=foncorp_travel_data,BIGQUERY_TABLE_ID=travel_requests,THREADS=${CONCURRENCY},PROFILE_TOKEN=${PROFILE_TOKEN} \
 --project=fon-test-project
@@ -2,57 +2,62 @@ import functions_framework
 import flask # o from flask import jsonify, make_response, request
 from google.cloud import bigquery
 import datetime # Para el timestamp de actualización
-from typing import Dict, Any # Para tipado
+from typing import Dict, Any, Optional # Para tipado
 import os
+import threading
+
+from openapi_validator import RequestValidationError, compile_request_validator
+from request_profiling import profiled_webhook
+from structured_logging import get_logger
 
 # --- Configuración de BigQuery (asumimos que ya está definida como en las otras funciones) ---
 BIGQUERY_PROJECT_ID = os.environ.get("BIGQUERY_PROJECT_ID", "fon-test-project")
 BIGQUERY_DATASET_ID = os.environ.get("BIGQUERY_DATASET_ID", "foncorp_travel_data")
 BIGQUERY_TABLE_ID = os.environ.get("BIGQUERY_TABLE_ID", "travel_requests")
+TABLE_REF_STR = f"{BIGQUERY_PROJECT_ID}.{BIGQUERY_DATASET_ID}.{BIGQUERY_TABLE_ID}"
+
+# Logging estructurado, muestreado y en segundo plano (ver structured_logging.py)
+log = get_logger("actualizar_viaje_tool_webhook")
+
+# --- Cliente de BigQuery compartido ---
+# Con --concurrency > 1 la instancia atiende varias peticiones a la vez (hilos gthread de
+# functions-framework), así que se reutiliza un único cliente por proceso en lugar de
+# crear uno (y su pool de conexiones) en cada llamada. bigquery.Client es thread-safe.
+_bq_client: Optional[bigquery.Client] = None
+_bq_client_lock = threading.Lock()
+
+def _get_bq_client() -> bigquery.Client:
+    """Devuelve el cliente de BigQuery del proceso, creándolo la primera vez que se pide."""
+    global _bq_client
+    if _bq_client is None:
+        with _bq_client_lock:
+            if _bq_client is None:
+                _bq_client = bigquery.Client(project=BIGQUERY_PROJECT_ID)
+    return _bq_client
+
+# --- Validación de entrada ---
+# El esquema del requestBody de la spec OpenAPI se compila una vez al arrancar la instancia;
+# incluye la tabla de estados válidos (enum de 'new_status').
+_validate_request = compile_request_validator(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "openapi_actualiza_viaje.yaml"))
 
 # --- Lógica de Negocio Interna (tu función original update_travel_request_status) ---
 def _update_travel_status_in_bq(request_id: str, new_status: str) -> Dict[str, Any]:
     """Actualiza el estado de una solicitud de viaje en BigQuery.
+    'new_status' debe ser ya uno de los valores canónicos del enum (lo garantiza el validador).
     Devuelve un diccionario con 'status_message'.
     """
-    valid_statuses = ["Registrada", "Pendiente de Aprobación", "Aprobada", "Rechazada", "Reservada", "Completada", "Cancelada"]
-    
-    # Normalizar el new_status para comparación y para guardarlo consistentemente
-    normalized_new_status_input = new_status.strip().lower()
-    final_status_to_save = new_status.strip().capitalize() # Capitalizar el input del usuario por defecto
-
-    # Mapeo simple para términos comunes que podría pasar el LLM
-    if "pendiente de aprobaci" in normalized_new_status_input:
-        final_status_to_save = "Pendiente de Aprobación"
-    elif "registrada" in normalized_new_status_input:
-        final_status_to_save = "Registrada"
-    # Añadir más mapeos si es necesario para otros estados normalizados
-    elif "aprobada" in normalized_new_status_input:
-        final_status_to_save = "Aprobada"
-    elif "rechazada" in normalized_new_status_input:
-        final_status_to_save = "Rechazada"
-    elif "reservada" in normalized_new_status_input:
-        final_status_to_save = "Reservada"
-    elif "completada" in normalized_new_status_input:
-        final_status_to_save = "Completada"
-    elif "cancelada" in normalized_new_status_input:
-        final_status_to_save = "Cancelada"
-    
-    if final_status_to_save not in valid_statuses:
-        return {"status_message": f"Error: '{new_status}' (interpretado como '{final_status_to_save}') no es un estado válido. Los estados válidos son: {', '.join(valid_statuses)}."}
-
     try:
-        client = bigquery.Client(project=BIGQUERY_PROJECT_ID)
-        table_ref_str = f"{BIGQUERY_PROJECT_ID}.{BIGQUERY_DATASET_ID}.{BIGQUERY_TABLE_ID}"
+        client = _get_bq_client()
         
         query = f"""
-            UPDATE `{table_ref_str}`
+            UPDATE `{TABLE_REF_STR}`
             SET status = @new_status_param, timestamp = @current_timestamp_param
             WHERE request_id = @request_id_param
         """
         job_config = bigquery.QueryJobConfig(
             query_parameters=[
-                bigquery.ScalarQueryParameter("new_status_param", "STRING", final_status_to_save),
+                bigquery.ScalarQueryParameter("new_status_param", "STRING", new_status),
                 bigquery.ScalarQueryParameter("request_id_param", "STRING", request_id),
                 bigquery.ScalarQueryParameter("current_timestamp_param", "TIMESTAMP", datetime.datetime.now(datetime.timezone.utc).isoformat())
             ]
@@ -61,20 +66,21 @@ def _update_travel_status_in_bq(request_id: str, new_status: str) -> Dict[str, A
         query_job.result()  # Esperar a que el UPDATE termine
 
         if query_job.num_dml_affected_rows is not None and query_job.num_dml_affected_rows > 0:
-            success_message = f"El estado de la solicitud de viaje con ID '{request_id}' ha sido actualizado exitosamente a '{final_status_to_save}'."
+            success_message = f"El estado de la solicitud de viaje con ID '{request_id}' ha sido actualizado exitosamente a '{new_status}'."
             return {"status_message": success_message}
         else:
             # Esto puede ocurrir si el request_id no existe o el estado ya era el new_status
-            not_found_message = f"No se encontró una solicitud de viaje con ID '{request_id}' o el estado ya era '{final_status_to_save}' (no se realizaron cambios)."
+            not_found_message = f"No se encontró una solicitud de viaje con ID '{request_id}' o el estado ya era '{new_status}' (no se realizaron cambios)."
             return {"status_message": not_found_message}
 
     except Exception as e:
-        print(f"ERROR GENERAL en _update_travel_status_in_bq: {e}")
+        log.error("Error general en _update_travel_status_in_bq", exc_info=True, request_id=request_id)
         return {"status_message": f"Error técnico al actualizar el estado de la solicitud '{request_id}': {str(e)}."}
 
 
 # Punto de entrada para la Cloud Function HTTP de 2ª Generación
 @functions_framework.http
+@profiled_webhook
 def actualizar_viaje_tool_webhook(request: flask.Request) -> flask.Response:
     """Cloud Function HTTP para actualizar el estado de una solicitud de viaje."""
     if request.method != 'POST':
@@ -85,17 +91,15 @@ def actualizar_viaje_tool_webhook(request: flask.Request) -> flask.Response:
         if not request_json:
             return flask.make_response(flask.jsonify({"error": "Solicitud JSON inválida o vacía"}), 400)
 
-        print(f"Request JSON recibido en actualizar_viaje_tool_webhook: {request_json}")
+        log.info("Request JSON recibido", payload=request_json)
 
-        request_id = request_json.get("request_id")
-        new_status = request_json.get("new_status")
+        try:
+            args = _validate_request(request_json)
+        except RequestValidationError as e:
+            return flask.make_response(flask.jsonify({"update_status_message": f"Solicitud inválida: {e}"}), 400)
+        request_id = args["request_id"]
+        new_status = args["new_status"]
 
-        if not request_id or not new_status:
-            missing = []
-            if not request_id: missing.append("'request_id'")
-            if not new_status: missing.append("'new_status'")
-            return flask.make_response(flask.jsonify({"tool_response_message": f"Faltan parámetros requeridos: {', '.join(missing)}."}), 400)
-        
         # Llamar a la lógica de negocio
         result_dict = _update_travel_status_in_bq(request_id=request_id, new_status=new_status)
 
@@ -104,11 +108,11 @@ def actualizar_viaje_tool_webhook(request: flask.Request) -> flask.Response:
             "update_status_message": result_dict.get("status_message") # El nombre de este parámetro de salida lo definiremos en OpenAPI
         }
         
-        print(f"Respuesta del webhook actualizar_viaje_tool_webhook: {playbook_tool_response}")
+        log.info("Respuesta del webhook", response=playbook_tool_response)
         return flask.jsonify(playbook_tool_response)
 
     except Exception as e:
-        print(f"Error general en el webhook actualizar_viaje_tool_webhook: {e}")
+        log.error("Error general en el webhook", exc_info=True)
         error_response_payload = {
             "update_status_message": f"Error interno crítico en la herramienta de actualización: {str(e)}"
         }
@@ -0,0 +1,125 @@
+# openapi_validator.py
+# Compila una sola vez (al arrancar la instancia) el esquema del requestBody de una spec
+# OpenAPI en un validador rápido, para rechazar peticiones inválidas antes de lanzar
+# ningún job de BigQuery. Este fichero se copia tal cual en cada Cloud Function y en el
+# paquete del agente (cada función se despliega desde su propio directorio): mantener
+# las copias idénticas.
+#
+# Soporta el subconjunto de OpenAPI 3.0 que usan nuestras specs: type (string, integer,
+# number, boolean), nullable, format: date (YYYY-MM-DD), enum, minLength y required.
+# Los enum se resuelven sin distinguir mayúsculas ni tildes ('avion' -> 'Avión') y el
+# validador devuelve el valor canónico, de modo que el resto del código trabaja siempre
+# con los valores de la tabla.
+import datetime
+import re
+import unicodedata
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import yaml
+
+_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_JSON_TYPES = {
+    "string": (str,),
+    "integer": (int,),
+    "number": (int, float),
+    "boolean": (bool,),
+}
+_TYPE_NAMES = {"string": "un texto", "integer": "un entero", "number": "un número", "boolean": "un booleano"}
+
+# Un checker recibe el valor y devuelve (valor_normalizado, mensaje_de_error_o_None).
+_Checker = Callable[[Any], Tuple[Any, Optional[str]]]
+
+
+class RequestValidationError(ValueError):
+    """Petición que no cumple el esquema OpenAPI. 'errors' contiene un mensaje por campo."""
+
+    def __init__(self, errors: List[str]):
+        self.errors = errors
+        super().__init__(" ".join(errors))
+
+
+def normalize_enum_key(value: str) -> str:
+    """Clave de búsqueda para enums: sin tildes, en minúsculas y con espacios simples."""
+    decomposed = unicodedata.normalize("NFKD", value)
+    without_accents = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(without_accents.lower().split())
+
+
+def load_request_schema(spec_path: str, path: str = "/", method: str = "post") -> Dict[str, Any]:
+    """Lee el esquema JSON del requestBody de una operación de la spec."""
+    with open(spec_path, encoding="utf-8") as spec_file:
+        spec = yaml.safe_load(spec_file)
+    return spec["paths"][path][method]["requestBody"]["content"]["application/json"]["schema"]
+
+
+def _compile_property(name: str, prop_schema: Dict[str, Any]) -> _Checker:
+    prop_type = prop_schema.get("type", "string")
+    python_types = _JSON_TYPES[prop_type]
+    type_error = f"'{name}' debe ser {_TYPE_NAMES[prop_type]}."
+    min_length = prop_schema.get("minLength")
+    length_error = (f"'{name}' no puede estar vacío." if min_length == 1
+                    else f"'{name}' debe tener al menos {min_length} caracteres.")
+    is_date = prop_schema.get("format") == "date"
+    enum_table = {normalize_enum_key(str(v)): v for v in prop_schema.get("enum", [])}
+    enum_listing = ", ".join(str(v) for v in prop_schema.get("enum", []))
+
+    def check(value: Any) -> Tuple[Any, Optional[str]]:
+        # bool es subclase de int: no aceptarlo donde se espera un número
+        if not isinstance(value, python_types) or (isinstance(value, bool) and prop_type != "boolean"):
+            return value, type_error
+        if min_length is not None and len(value) < min_length:
+            return value, length_error
+        if is_date:
+            if not _DATE_RE.match(value):
+                return value, f"'{name}' no tiene el formato YYYY-MM-DD: '{value}'."
+            try:
+                datetime.date.fromisoformat(value)
+            except ValueError:
+                return value, f"'{name}' no es una fecha válida: '{value}'."
+        if enum_table:
+            canonical = enum_table.get(normalize_enum_key(value))
+            if canonical is None:
+                return value, f"'{name}' no es válido: '{value}'. Valores válidos: {enum_listing}."
+            return canonical, None
+        return value, None
+
+    return check
+
+
+def compile_schema(schema: Dict[str, Any]) -> Callable[[Any], Dict[str, Any]]:
+    """Compila un esquema 'type: object' en una función payload -> dict normalizado.
+    El dict devuelto contiene todas las propiedades del esquema (None si se omitieron
+    o son null) y descarta las desconocidas. Un campo requerido a null cuenta como
+    ausente salvo que sea 'nullable'. Lanza RequestValidationError con todos los errores.
+    """
+    properties = schema.get("properties", {})
+    checkers = [(name, _compile_property(name, prop)) for name, prop in properties.items()]
+    required = [name for name in schema.get("required", [])
+                if name in properties and not properties[name].get("nullable", False)]
+
+    def validate(payload: Any) -> Dict[str, Any]:
+        if not isinstance(payload, dict):
+            raise RequestValidationError(["El cuerpo de la petición debe ser un objeto JSON."])
+        missing = [name for name in required if payload.get(name) is None]
+        errors: List[str] = []
+        if missing:
+            errors.append(f"Faltan campos requeridos: {', '.join(missing)}.")
+        result: Dict[str, Any] = {}
+        for name, check in checkers:
+            value = payload.get(name)
+            if value is None:
+                result[name] = None
+                continue
+            result[name], error = check(value)
+            if error:
+                errors.append(error)
+        if errors:
+            raise RequestValidationError(errors)
+        return result
+
+    return validate
+
+
+def compile_request_validator(spec_path: str, path: str = "/", method: str = "post") -> Callable[[Any], Dict[str, Any]]:
+    """Atajo: carga el requestBody de la spec y lo compila."""
+    return compile_schema(load_request_schema(spec_path, path, method))
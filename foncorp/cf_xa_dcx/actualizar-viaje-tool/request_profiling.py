@@ -0,0 +1,177 @@
+# request_profiling.py
+# Perfilado bajo demanda de una única invocación (webhook o herramienta del agente).
+# Este fichero se copia tal cual en cada Cloud Function y en el paquete del agente
+# (cada función se despliega desde su propio directorio): mantener las copias idénticas.
+#
+# Activación:
+#   - PROFILE_REQUESTS=1 perfila todas las invocaciones de la instancia.
+#   - Cabecera 'X-Profile-Token' con el valor de PROFILE_TOKEN perfila solo esa petición
+#     (si PROFILE_TOKEN no está definido la cabecera se ignora).
+# Modos (PROFILE_MODE):
+#   - 'sample' (por defecto): muestreo de pila del hilo de la petición cada
+#     PROFILE_SAMPLE_INTERVAL_MS, en formato "collapsed" (.folded) listo para flamegraph.pl
+#     o speedscope. Solo ve el hilo de la petición, así que es válido con --concurrency > 1.
+#   - 'cprofile': perfil determinista de cProfile. En python312 su hook es global al
+#     intérprete y recoge también los hilos de las demás peticiones en curso: usarlo solo
+#     con CONCURRENCY=1.
+# Salida:
+#   - Petición con 'X-Profile-Token': el perfil se devuelve en el cuerpo de la respuesta
+#     (text/plain; en modo cprofile, el informe de pstats), en lugar de la respuesta del
+#     webhook, cuyo código HTTP va en la cabecera 'X-Profile-Response-Status'. El /tmp de
+#     una instancia serverless no es accesible desde fuera.
+#   - PROFILE_REQUESTS=1: el perfil se escribe en PROFILE_DIR (.folded o .prof) y se
+#     registra su ruta; pensado para ejecuciones locales.
+# Con el perfilado desactivado el coste es una comprobación de booleano y de una cabecera.
+import cProfile
+import collections
+import datetime
+import functools
+import hmac
+import io
+import logging
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import uuid
+from typing import Any, Callable, Dict, Optional, Tuple
+
+PROFILE_ALL_REQUESTS = os.environ.get("PROFILE_REQUESTS", "").lower() in ("1", "true", "yes")
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN", "")
+PROFILE_MODE = os.environ.get("PROFILE_MODE", "sample").lower()
+PROFILE_DIR = os.environ.get("PROFILE_DIR", tempfile.gettempdir())
+PROFILE_SAMPLE_INTERVAL_S = float(os.environ.get("PROFILE_SAMPLE_INTERVAL_MS", "1")) / 1000.0
+
+PROFILE_REPORT_LINES = 60 # Funciones listadas en el informe de pstats devuelto en la respuesta
+
+PROFILE_TOKEN_HEADER = "X-Profile-Token"
+PROFILE_STATUS_HEADER = "X-Profile-Response-Status"
+
+# cProfile instala un hook de perfilado global al intérprete (3.12+), así que solo puede
+# haber un perfil determinista activo a la vez; el resto de peticiones se atienden sin perfilar.
+_cprofile_lock = threading.Lock()
+
+# Hijo de "foncorp": si structured_logging está configurado, sale por su cola en segundo plano.
+# Es un logger estándar, no un StructuredLogger, así que LOG_SAMPLE_RATES no le aplica: los
+# avisos de perfil escrito no se pierden por muestreo.
+_log = logging.getLogger("foncorp.request_profiling")
+
+
+# Resultado de un perfilado: extensión del fichero, writer(ruta) y render() -> texto.
+ProfileOutput = collections.namedtuple("ProfileOutput", ["extension", "write", "render"])
+
+
+def _write_profile(name: str, profile: ProfileOutput) -> Optional[str]:
+    """Escribe el perfil en PROFILE_DIR. Un fallo de escritura no debe romper la petición."""
+    timestamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%S")
+    path = os.path.join(PROFILE_DIR, f"{name}-{timestamp}-{uuid.uuid4().hex[:8]}.{profile.extension}")
+    try:
+        profile.write(path)
+    except OSError as e:
+        _log.warning("No se pudo escribir el perfil de '%s': %s", name, e)
+        return None
+    return path
+
+
+def _run_cprofile(func: Callable[..., Any], *args, **kwargs) -> Tuple[Any, Optional[ProfileOutput]]:
+    if not _cprofile_lock.acquire(blocking=False):
+        return func(*args, **kwargs), None
+    profiler = cProfile.Profile()
+    try:
+        result = profiler.runcall(func, *args, **kwargs)
+    finally:
+        _cprofile_lock.release()
+
+    def render() -> str:
+        report = io.StringIO()
+        pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(PROFILE_REPORT_LINES)
+        return report.getvalue()
+
+    return result, ProfileOutput("prof", profiler.dump_stats, render)
+
+
+def _run_sampled(name: str, func: Callable[..., Any], *args, **kwargs) -> Tuple[Any, Optional[ProfileOutput]]:
+    target_thread_id = threading.get_ident()
+    stacks: Dict[str, int] = collections.Counter()
+    done = threading.Event()
+
+    def sampler() -> None:
+        while not done.wait(PROFILE_SAMPLE_INTERVAL_S):
+            frame = sys._current_frames().get(target_thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                stacks[";".join(reversed(stack))] += 1
+
+    sampler_thread = threading.Thread(target=sampler, name=f"profile-sampler-{name}", daemon=True)
+    sampler_thread.start()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        done.set()
+        sampler_thread.join()
+
+    def render() -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.items())
+
+    def write(path: str) -> None:
+        with open(path, "w", encoding="utf-8") as profile_file:
+            profile_file.write(render())
+
+    return result, ProfileOutput("folded", write, render)
+
+
+def run_profiled(name: str, func: Callable[..., Any], *args, **kwargs) -> Tuple[Any, Optional[ProfileOutput]]:
+    """Ejecuta func perfilándola según PROFILE_MODE.
+    Devuelve (resultado, perfil), con perfil None si no se pudo perfilar.
+    """
+    if PROFILE_MODE == "cprofile":
+        return _run_cprofile(func, *args, **kwargs)
+    return _run_sampled(name, func, *args, **kwargs)
+
+
+def _token_matches(header_token: Optional[str]) -> bool:
+    # compare_digest sobre bytes: con str lanza TypeError si la cabecera trae caracteres no ASCII
+    return bool(header_token) and hmac.compare_digest(header_token.encode("utf-8"), PROFILE_TOKEN.encode("utf-8"))
+
+
+def profiled_webhook(handler: Callable[[Any], Any]) -> Callable[[Any], Any]:
+    """Decorador para webhooks HTTP (flask.Request -> flask.Response)."""
+    @functools.wraps(handler)
+    def wrapper(request):
+        by_token = bool(PROFILE_TOKEN) and _token_matches(request.headers.get(PROFILE_TOKEN_HEADER))
+        if not PROFILE_ALL_REQUESTS and not by_token:
+            return handler(request)
+        response, profile = run_profiled(handler.__name__, handler, request)
+        if profile is None:
+            return response
+        if by_token and hasattr(response, "set_data"):
+            response.headers[PROFILE_STATUS_HEADER] = str(response.status_code)
+            response.set_data(profile.render())
+            response.mimetype = "text/plain"
+            return response
+        path = _write_profile(handler.__name__, profile)
+        if path:
+            _log.info("Perfil de %s escrito en %s", handler.__name__, path)
+        return response
+    return wrapper
+
+
+def profiled_tool(func: Callable[..., Any]) -> Callable[..., Any]:
+    """Decorador para herramientas del agente; solo se activa con PROFILE_REQUESTS.
+    functools.wraps conserva la firma y el docstring que ADK usa para declarar la herramienta.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not PROFILE_ALL_REQUESTS:
+            return func(*args, **kwargs)
+        result, profile = run_profiled(func.__name__, func, *args, **kwargs)
+        path = _write_profile(func.__name__, profile) if profile else None
+        if path:
+            _log.info("Perfil de %s escrito en %s", func.__name__, path)
+        return result
+    return wrapper
@@ -0,0 +1,96 @@
+import functions_framework
+import flask # o from flask import jsonify, make_response, request
+from google.cloud import bigquery
+from typing import Dict, Any, Optional # Para tipado
+import os
+import threading
+
+from openapi_validator import RequestValidationError, compile_request_validator
+from request_profiling import profiled_webhook
+from structured_logging import get_logger
+from travel_analytics import fetch_travel_table, format_summary, summarize_travel_table
+
+# --- Configuración de BigQuery ---
+BIGQUERY_PROJECT_ID = os.environ.get("BIGQUERY_PROJECT_ID", "fon-test-project")
+BIGQUERY_DATASET_ID = os.environ.get("BIGQUERY_DATASET_ID", "foncorp_travel_data")
+BIGQUERY_TABLE_ID = os.environ.get("BIGQUERY_TABLE_ID", "travel_requests")
+TABLE_REF_STR = f"{BIGQUERY_PROJECT_ID}.{BIGQUERY_DATASET_ID}.{BIGQUERY_TABLE_ID}"
+
+# Logging estructurado, muestreado y en segundo plano (ver structured_logging.py)
+log = get_logger("analizar_viajes_tool_webhook")
+
+# --- Cliente de BigQuery compartido ---
+# Con --concurrency > 1 la instancia atiende varias peticiones a la vez (hilos gthread de
+# functions-framework), así que se reutiliza un único cliente por proceso en lugar de
+# crear uno (y su pool de conexiones) en cada llamada. bigquery.Client es thread-safe.
+_bq_client: Optional[bigquery.Client] = None
+_bq_client_lock = threading.Lock()
+
+def _get_bq_client() -> bigquery.Client:
+    """Devuelve el cliente de BigQuery del proceso, creándolo la primera vez que se pide."""
+    global _bq_client
+    if _bq_client is None:
+        with _bq_client_lock:
+            if _bq_client is None:
+                _bq_client = bigquery.Client(project=BIGQUERY_PROJECT_ID)
+    return _bq_client
+
+# --- Validación de entrada ---
+# El esquema del requestBody de la spec OpenAPI se compila una vez al arrancar la instancia;
+# incluye las tablas de medios de transporte y estados.
+_validate_request = compile_request_validator(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "openapi_analizar_viajes.yaml"))
+
+# --- Lógica de Negocio Interna ---
+def _analyze_travel_requests_in_bq(filters: Dict[str, Optional[str]]) -> Dict[str, Any]:
+    """Lee las columnas filtradas de travel_requests como Arrow y calcula los agregados en proceso.
+    Devuelve un diccionario con 'analytics_result_string' y 'analytics' (None si hubo error).
+    """
+    try:
+        table = fetch_travel_table(_get_bq_client(), TABLE_REF_STR, **filters)
+        summary = summarize_travel_table(table)
+        log.debug("Análisis resuelto", filters=filters, rows=table.num_rows)
+        return {"analytics_result_string": format_summary(summary, filters), "analytics": summary}
+    except Exception as e:
+        log.error("Error general en _analyze_travel_requests_in_bq", exc_info=True, filters=filters)
+        return {"analytics_result_string": f"Error técnico al analizar las solicitudes de viaje: {str(e)}.", "analytics": None}
+
+
+# Punto de entrada para la Cloud Function HTTP de 2ª Generación
+@functions_framework.http
+@profiled_webhook
+def analizar_viajes_tool_webhook(request: flask.Request) -> flask.Response:
+    """Cloud Function HTTP para calcular estadísticas de solicitudes de viaje."""
+    if request.method != 'POST':
+        return flask.make_response(("Método no permitido", 405))
+
+    try:
+        request_json = request.get_json(silent=True)
+        if request_json is None: # Un objeto vacío es válido: analiza toda la tabla
+            return flask.make_response(flask.jsonify({"error": "Solicitud JSON inválida o vacía"}), 400)
+
+        log.info("Request JSON recibido", payload=request_json)
+
+        try:
+            filters = _validate_request(request_json)
+        except RequestValidationError as e:
+            return flask.make_response(flask.jsonify({"analytics_results_string": f"Solicitud inválida: {e}"}), 400)
+
+        # Llamar a la lógica de negocio
+        result_dict = _analyze_travel_requests_in_bq(filters)
+
+        # La respuesta de la tool para Playbooks: los parámetros de salida definidos en OpenAPI
+        playbook_tool_response = {
+            "analytics_results_string": result_dict.get("analytics_result_string"),
+            "analytics": result_dict.get("analytics"),
+        }
+
+        log.info("Respuesta del webhook", response=playbook_tool_response)
+        return flask.jsonify(playbook_tool_response)
+
+    except Exception as e:
+        log.error("Error general en el webhook", exc_info=True)
+        error_response_payload = {
+            "analytics_results_string": f"Error interno crítico en la herramienta de análisis: {str(e)}"
+        }
+        return flask.make_response(flask.jsonify(error_response_payload), 500)
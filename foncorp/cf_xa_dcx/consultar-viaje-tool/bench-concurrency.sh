@@ -0,0 +1,15 @@
+# Mide el throughput de una instancia con distintos niveles de concurrencia (requiere `hey`).
+# Desplegar antes con `MAX_INSTANCES=1 ./deploy.sh` para que todas las peticiones caigan en la
+# misma instancia; las peticiones/s deberían crecer casi linealmente hasta el límite marcado por
+# la latencia de BigQuery. Para una prueba local (functions-framework) usar URL=http://localhost:8080 TOKEN=.
+URL=${URL:-https://europe-west1-fon-test-project.cloudfunctions.net/consultar-viaje-tool}
+TOKEN=${TOKEN-$(gcloud auth print-identity-token)}
+
+for c in 1 2 4 8 16; do
+  echo "--- concurrencia ${c}"
+  hey -n $((c * 20)) -c ${c} -m POST \
+      -H "Authorization: Bearer ${TOKEN}" \
+      -H "Content-Type: application/json" \
+      -d '{"search_term": "pendientes"}' \
+      "${URL}" | grep -E "Requests/sec|99% in"
+done
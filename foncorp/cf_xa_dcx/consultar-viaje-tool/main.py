@@ -2,71 +2,104 @@ import functions_framework
 import flask # o from flask import jsonify, make_response, request
 from google.cloud import bigquery
 import datetime # Solo para formatear el timestamp en la respuesta
-from typing import Dict, Any, List # Para tipado
+from typing import Dict, Any, List, Optional # Para tipado
 import os
+import threading
+
+from openapi_validator import RequestValidationError, compile_request_validator
+from read_replica import create_replica_from_env
+from request_profiling import profiled_webhook
+from structured_logging import get_logger
 
 # --- Configuración de BigQuery ---
 BIGQUERY_PROJECT_ID = os.environ.get("BIGQUERY_PROJECT_ID", "fon-test-project")
 BIGQUERY_DATASET_ID = os.environ.get("BIGQUERY_DATASET_ID", "foncorp_travel_data")
 BIGQUERY_TABLE_ID = os.environ.get("BIGQUERY_TABLE_ID", "travel_requests") # Tabla con nuevo esquema
+TABLE_REF_STR = f"{BIGQUERY_PROJECT_ID}.{BIGQUERY_DATASET_ID}.{BIGQUERY_TABLE_ID}"
+
+# Logging estructurado, muestreado y en segundo plano (ver structured_logging.py)
+log = get_logger("consultar_viajes_tool_webhook")
+
+# --- Cliente de BigQuery compartido ---
+# Con --concurrency > 1 la instancia atiende varias peticiones a la vez (hilos gthread de
+# functions-framework), así que se reutiliza un único cliente por proceso en lugar de
+# crear uno (y su pool de conexiones) en cada llamada. bigquery.Client es thread-safe.
+_bq_client: Optional[bigquery.Client] = None
+_bq_client_lock = threading.Lock()
+
+def _get_bq_client() -> bigquery.Client:
+    """Devuelve el cliente de BigQuery del proceso, creándolo la primera vez que se pide."""
+    global _bq_client
+    if _bq_client is None:
+        with _bq_client_lock:
+            if _bq_client is None:
+                _bq_client = bigquery.Client(project=BIGQUERY_PROJECT_ID)
+    return _bq_client
+
+# --- Validación de entrada ---
+# El esquema del requestBody de la spec OpenAPI se compila una vez al arrancar la instancia.
+_validate_request = compile_request_validator(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "openapi_consultar_viajes.yaml"))
+
+# --- Réplica local opcional (ver read_replica.py) ---
+# Si READ_REPLICA_PATH está definido, las consultas se sirven desde un SQLite local sincronizado
+# de forma incremental; BigQuery queda como respaldo cuando la réplica es demasiado antigua.
+_replica = create_replica_from_env(_get_bq_client, TABLE_REF_STR)
 
 # --- Lógica de Negocio Interna (tu función original get_travel_requests_by_status) ---
+def _resolve_search_statuses(search_term: str) -> List[str]:
+    """Interpreta el search_term y devuelve los estados a buscar (lista vacía si no se entiende)."""
+    statuses: List[str] = []
+    processed_search_term = search_term.lower().strip()
+
+    # Lógica de interpretación del search_term (como la teníamos)
+    if "pendiente" in processed_search_term or \
+       "sin aprobar" in processed_search_term or \
+       "nuevas" in processed_search_term or \
+       ("registrada" in processed_search_term and "aprobaci" not in processed_search_term) :
+        statuses.append("Registrada")
+        if "aprobaci" in processed_search_term or "pendiente" in processed_search_term :
+            statuses.append("Pendiente de Aprobación")
+
+    exact_final_statuses = ["aprobada", "rechazada", "reservada", "completada", "cancelada"]
+    if processed_search_term in exact_final_statuses or \
+       (not statuses and processed_search_term): # Si no se activó la lógica anterior Y el término no está vacío
+        # Pasamos el search_term original: la comparación no distingue mayúsculas
+        statuses = [search_term.strip()]
+    return statuses
+
+def _get_rows_by_statuses_from_bq(statuses: List[str]) -> List[Any]:
+    """Las 10 solicitudes más recientes con alguno de los estados, leídas de BigQuery."""
+    status_conditions = [f"LOWER(status) = LOWER(@status_param_{i})" for i in range(1, len(statuses) + 1)]
+    query_params = [bigquery.ScalarQueryParameter(f"status_param_{i}", "STRING", status)
+                    for i, status in enumerate(statuses, start=1)]
+    where_clause = " OR ".join(status_conditions)
+    # Asegúrate de que los nombres de columna coincidan con tu tabla BQ (employee_first_name, etc.)
+    query = f"""
+        SELECT request_id, timestamp, employee_first_name, employee_last_name, employee_id, 
+               origin_city, destination_city, start_date, end_date, transport_mode, car_type, reason, status
+        FROM `{TABLE_REF_STR}` WHERE {where_clause} ORDER BY timestamp DESC LIMIT 10
+    """
+    job_config = bigquery.QueryJobConfig(query_parameters=query_params)
+    query_job = _get_bq_client().query(query, job_config=job_config)
+    return list(query_job.result())
+
 def _get_travel_requests_from_bq(search_term: str) -> Dict[str, Any]:
     """Consulta solicitudes de viaje y devuelve un diccionario con 'query_result_string'.
+    Usa la réplica local si está activa y es suficientemente reciente; si no, BigQuery.
     """
     try:
-        client = bigquery.Client(project=BIGQUERY_PROJECT_ID)
-        table_ref_str = f"{BIGQUERY_PROJECT_ID}.{BIGQUERY_DATASET_ID}.{BIGQUERY_TABLE_ID}"
-        status_conditions = []
-        query_params = []
-        param_counter = 0
-        processed_search_term = search_term.lower().strip()
-
-        # Lógica de interpretación del search_term (como la teníamos)
-        if "pendiente" in processed_search_term or \
-           "sin aprobar" in processed_search_term or \
-           "nuevas" in processed_search_term or \
-           ("registrada" in processed_search_term and "aprobaci" not in processed_search_term) :
-            
-            param_counter += 1
-            status_conditions.append(f"LOWER(status) = LOWER(@status_param_{param_counter})")
-            query_params.append(bigquery.ScalarQueryParameter(f"status_param_{param_counter}", "STRING", "Registrada"))
-            
-            if "aprobaci" in processed_search_term or "pendiente" in processed_search_term :
-                 param_counter += 1
-                 if not any(p.value.lower() == "pendiente de aprobación" for p in query_params):
-                    status_conditions.append(f"LOWER(status) = LOWER(@status_param_{param_counter})")
-                    query_params.append(bigquery.ScalarQueryParameter(f"status_param_{param_counter}", "STRING", "Pendiente de Aprobación"))
-        
-        exact_final_statuses = ["aprobada", "rechazada", "reservada", "completada", "cancelada"]
-        if processed_search_term in exact_final_statuses or \
-           (not status_conditions and processed_search_term): # Si no se activó la lógica anterior Y el término no está vacío
-            status_conditions = [] 
-            query_params = []
-            param_counter = 0
-            
-            param_counter += 1
-            status_conditions.append(f"LOWER(status) = LOWER(@status_param_{param_counter})")
-            # Pasamos el search_term original para que BigQuery (con LOWER()) maneje la capitalización
-            query_params.append(bigquery.ScalarQueryParameter(f"status_param_{param_counter}", "STRING", search_term.strip()))
-
-        if not status_conditions:
-             print(f"Término de búsqueda no interpretado en _get_travel_requests_from_bq: '{search_term}'.")
+        statuses = _resolve_search_statuses(search_term)
+        if not statuses:
+             log.info("Término de búsqueda no interpretado", search_term=search_term)
              return {"query_result_string": f"No pude interpretar el término de búsqueda de estado: '{search_term}'. Por favor, usa estados conocidos."}
 
-        where_clause = " OR ".join(status_conditions)
-        # Asegúrate de que los nombres de columna coincidan con tu tabla BQ (employee_first_name, etc.)
-        query = f"""
-            SELECT request_id, timestamp, employee_first_name, employee_last_name, employee_id, 
-                   origin_city, destination_city, start_date, end_date, transport_mode, car_type, reason, status
-            FROM `{table_ref_str}` WHERE {where_clause} ORDER BY timestamp DESC LIMIT 10
-        """
-        job_config = bigquery.QueryJobConfig(query_parameters=query_params)
-        query_job = client.query(query, job_config=job_config)
-        results = query_job.result()
-
-        if results.total_rows == 0:
-            print(f"No se encontraron solicitudes para '{search_term}' en _get_travel_requests_from_bq.")
+        results = _replica.query_by_statuses(statuses, limit=10) if _replica else None
+        if results is None: # Réplica desactivada o demasiado antigua
+            results = _get_rows_by_statuses_from_bq(statuses)
+
+        if not results:
+            log.info("No se encontraron solicitudes", search_term=search_term)
             return {"query_result_string": f"No se encontraron solicitudes de viaje para el término de búsqueda: '{search_term}'."}
 
         found_requests_str_list = []
@@ -83,16 +116,17 @@ def _get_travel_requests_from_bq(search_term: str) -> Dict[str, Any]:
             found_requests_str_list.append(request_summary)
         
         final_response_str = f"Se encontraron {len(found_requests_str_list)} solicitudes para '{search_term}':\n" + "\n".join(found_requests_str_list)
-        print(f"Respuesta de _get_travel_requests_from_bq: {final_response_str}")
+        log.debug("Consulta resuelta", search_term=search_term, rows=len(found_requests_str_list), result_chars=len(final_response_str))
         return {"query_result_string": final_response_str}
 
     except Exception as e:
-        print(f"ERROR GENERAL en _get_travel_requests_from_bq: {e}")
+        log.error("Error general en _get_travel_requests_from_bq", exc_info=True, search_term=search_term)
         return {"query_result_string": f"Error técnico al consultar las solicitudes de viaje: {str(e)}."}
 
 
 # Punto de entrada para la Cloud Function HTTP de 2ª Generación
 @functions_framework.http
+@profiled_webhook
 def consultar_viajes_tool_webhook(request: flask.Request) -> flask.Response:
     """Cloud Function HTTP para consultar solicitudes de viaje por estado."""
     if request.method != 'POST':
@@ -103,12 +137,14 @@ def consultar_viajes_tool_webhook(request: flask.Request) -> flask.Response:
         if not request_json:
             return flask.make_response(flask.jsonify({"error": "Solicitud JSON inválida o vacía"}), 400)
 
-        print(f"Request JSON recibido en consultar_viajes_tool_webhook: {request_json}")
+        log.info("Request JSON recibido", payload=request_json)
+
+        try:
+            args = _validate_request(request_json)
+        except RequestValidationError as e:
+            return flask.make_response(flask.jsonify({"query_results_string": f"Solicitud inválida: {e}"}), 400)
+        search_term = args["search_term"] # `search_term` podría ser una cadena vacía, lo que es válido
 
-        search_term = request_json.get("search_term") # Coincide con la OpenAPI spec
-        if search_term is None: # `search_term` podría ser una cadena vacía, lo que es válido
-            return flask.make_response(flask.jsonify({"tool_response_message": "Falta el parámetro requerido 'search_term'."}), 400)
-        
         # Llamar a la lógica de negocio
         result_dict = _get_travel_requests_from_bq(search_term=search_term)
 
@@ -117,11 +153,11 @@ def consultar_viajes_tool_webhook(request: flask.Request) -> flask.Response:
             "query_results_string": result_dict.get("query_result_string")
         }
         
-        print(f"Respuesta del webhook consultar_viajes_tool_webhook: {playbook_tool_response}")
+        log.info("Respuesta del webhook", response=playbook_tool_response)
         return flask.jsonify(playbook_tool_response)
 
     except Exception as e:
-        print(f"Error general en el webhook consultar_viajes_tool_webhook: {e}")
+        log.error("Error general en el webhook", exc_info=True)
         error_response_payload = {
             "query_results_string": f"Error interno crítico en la herramienta de consulta: {str(e)}"
         }
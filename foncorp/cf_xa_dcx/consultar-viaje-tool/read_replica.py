@@ -0,0 +1,222 @@
+# read_replica.py
+# Réplica local opcional (fichero SQLite por instancia) de travel_requests para servir las
+# consultas por estado sin ir a BigQuery en cada petición. La tabla es pequeña y cambia poco,
+# así que se sincroniza de forma incremental usando la columna 'timestamp' (que el INSERT y el
+# UPDATE de las tools fijan a la hora de la escritura) como marca de agua: solo se traen las
+# filas nuevas o modificadas y se hace upsert por request_id. Este fichero se copia tal cual en
+# consultar-viaje-tool y en el paquete del agente: mantener las copias idénticas.
+#
+# Configuración (variables de entorno):
+#   READ_REPLICA_PATH                   Ruta del fichero SQLite; vacío = réplica desactivada.
+#   READ_REPLICA_MAX_STALENESS_SECONDS  Antigüedad máxima con la que se sirve (por defecto 60);
+#                                       más antigua -> el llamante consulta BigQuery.
+#   READ_REPLICA_REFRESH_SECONDS        Antigüedad a partir de la cual se lanza un refresco en
+#                                       segundo plano sin bloquear la petición (por defecto 15).
+#   READ_REPLICA_SYNC_OVERLAP_SECONDS   Margen que se resta a la marca de agua al sincronizar,
+#                                       para no perder escrituras confirmadas con un timestamp
+#                                       algo anterior al último visto (por defecto 300).
+# Quien escribe en la tabla desde el mismo proceso (el agente) llama a invalidate() tras cada
+# DML para no servir datos anteriores a su propia escritura. Las escrituras de otros procesos
+# se ven, como mucho, READ_REPLICA_MAX_STALENESS_SECONDS después.
+# Limitación: los DELETE en BigQuery no se propagan (las tools nunca borran filas).
+import collections
+import datetime
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, List, Optional, Sequence
+
+from google.cloud import bigquery
+
+READ_REPLICA_PATH = os.environ.get("READ_REPLICA_PATH", "")
+READ_REPLICA_MAX_STALENESS_S = float(os.environ.get("READ_REPLICA_MAX_STALENESS_SECONDS", "60"))
+READ_REPLICA_REFRESH_S = float(os.environ.get("READ_REPLICA_REFRESH_SECONDS", "15"))
+READ_REPLICA_SYNC_OVERLAP_S = float(os.environ.get("READ_REPLICA_SYNC_OVERLAP_SECONDS", "300"))
+
+REPLICA_COLUMNS = [
+    "request_id", "timestamp", "employee_first_name", "employee_last_name", "employee_id",
+    "origin_city", "destination_city", "start_date", "end_date", "transport_mode", "car_type",
+    "reason", "status",
+]
+# Misma forma de acceso (row.status, row.timestamp...) que las filas de BigQuery
+ReplicaRow = collections.namedtuple("ReplicaRow", REPLICA_COLUMNS)
+
+# Formato fijo (siempre con microsegundos, en UTC) para que el orden de texto en SQLite
+# coincida con el orden temporal.
+_TS_FORMAT = "%Y-%m-%dT%H:%M:%S.%f+00:00"
+
+# Hijo de "foncorp": si structured_logging está configurado, sale por su cola en segundo plano.
+_log = logging.getLogger("foncorp.read_replica")
+
+
+def _ts_to_text(value: Optional[datetime.datetime]) -> Optional[str]:
+    if value is None:
+        return None
+    return value.astimezone(datetime.timezone.utc).strftime(_TS_FORMAT)
+
+
+class TravelReadReplica:
+    """Réplica SQLite de travel_requests con sincronización incremental y staleness acotada.
+    Segura con varios hilos: cada hilo lee con su propia conexión (modo WAL) y solo un
+    refresco se ejecuta a la vez.
+    """
+
+    def __init__(self, path: str, client_getter: Callable[[], bigquery.Client], table_ref: str,
+                 max_staleness_s: float = READ_REPLICA_MAX_STALENESS_S,
+                 refresh_after_s: float = READ_REPLICA_REFRESH_S,
+                 sync_overlap_s: float = READ_REPLICA_SYNC_OVERLAP_S):
+        self.path = path
+        self._client_getter = client_getter
+        self._table_ref = table_ref
+        self.max_staleness_s = max_staleness_s
+        self.refresh_after_s = min(refresh_after_s, max_staleness_s)
+        self._sync_overlap = datetime.timedelta(seconds=sync_overlap_s)
+        self._local = threading.local()
+        self._refresh_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._last_sync_monotonic: Optional[float] = None # Inicio del último refresco completado
+        self._generation = 0 # Se incrementa en cada invalidate()
+        self._create_schema()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL") # Es una caché: se reconstruye desde BigQuery
+            self._local.conn = conn
+        return conn
+
+    def _create_schema(self) -> None:
+        conn = self._connection()
+        with conn:
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS travel_requests (
+                    {', '.join(f'{c} TEXT' + (' PRIMARY KEY' if c == 'request_id' else '') for c in REPLICA_COLUMNS)},
+                    status_lower TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_status_ts ON travel_requests (status_lower, timestamp DESC)")
+            conn.execute("CREATE TABLE IF NOT EXISTS replica_meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def _high_water_mark(self) -> Optional[str]:
+        row = self._connection().execute("SELECT value FROM replica_meta WHERE key = 'high_water_mark'").fetchone()
+        return row[0] if row else None
+
+    def staleness_s(self) -> float:
+        """Segundos desde el inicio del último refresco completado (infinito si nunca)."""
+        if self._last_sync_monotonic is None:
+            return float("inf")
+        return time.monotonic() - self._last_sync_monotonic
+
+    def refresh(self) -> bool:
+        """Trae de BigQuery las filas con timestamp posterior a la marca de agua (menos el margen)
+        y las aplica. Devuelve False si ya había otro refresco en curso.
+        """
+        if not self._refresh_lock.acquire(blocking=False):
+            return False
+        try:
+            started = time.monotonic()
+            generation = self._generation
+            hwm_text = self._high_water_mark()
+            query = f"SELECT {', '.join(REPLICA_COLUMNS)} FROM `{self._table_ref}`"
+            params = []
+            if hwm_text:
+                since = datetime.datetime.strptime(hwm_text, _TS_FORMAT).replace(tzinfo=datetime.timezone.utc)
+                query += " WHERE timestamp > @since"
+                params.append(bigquery.ScalarQueryParameter("since", "TIMESTAMP", since - self._sync_overlap))
+            rows = self._client_getter().query(
+                query, job_config=bigquery.QueryJobConfig(query_parameters=params)).result()
+
+            new_hwm = hwm_text
+            records = []
+            for row in rows:
+                ts_text = _ts_to_text(row.timestamp)
+                if ts_text and (new_hwm is None or ts_text > new_hwm):
+                    new_hwm = ts_text
+                values = [ts_text if c == "timestamp" else (str(row[c]) if row[c] is not None else None)
+                          for c in REPLICA_COLUMNS]
+                records.append(values + [row.status.lower() if row.status else None])
+
+            conn = self._connection()
+            with conn:
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO travel_requests ({', '.join(REPLICA_COLUMNS)}, status_lower) "
+                    f"VALUES ({', '.join('?' * (len(REPLICA_COLUMNS) + 1))})", records)
+                if new_hwm:
+                    conn.execute("INSERT OR REPLACE INTO replica_meta (key, value) VALUES ('high_water_mark', ?)", (new_hwm,))
+            with self._state_lock:
+                # Un refresco que empezó antes de un invalidate() puede no incluir esa escritura
+                if self._generation == generation:
+                    self._last_sync_monotonic = started
+            # DEBUG: se sincroniza cada pocos segundos por instancia y este logger no pasa por el
+            # muestreo de LOG_SAMPLE_RATES
+            _log.debug("Réplica sincronizada: %d filas en %.0f ms", len(records), (time.monotonic() - started) * 1000)
+            return True
+        finally:
+            self._refresh_lock.release()
+
+    def invalidate(self) -> None:
+        """Marca la réplica como desactualizada tras una escritura: las consultas van a BigQuery
+        hasta que termine un refresco iniciado después de esta llamada (se lanza uno ya).
+        """
+        with self._state_lock:
+            self._generation += 1
+            self._last_sync_monotonic = None
+        self._refresh_in_background()
+
+    def _refresh_in_background(self) -> None:
+        def run() -> None:
+            try:
+                self.refresh()
+            except Exception:
+                _log.warning("Error al sincronizar la réplica local", exc_info=True)
+
+        threading.Thread(target=run, name="read-replica-refresh", daemon=True).start()
+
+    def query_by_statuses(self, statuses: Sequence[str], limit: int = 10) -> Optional[List[ReplicaRow]]:
+        """Solicitudes cuyo estado coincide (sin distinguir mayúsculas) con alguno de 'statuses',
+        de la más reciente a la más antigua. Devuelve None si la réplica es demasiado antigua
+        para servir la consulta: el llamante debe ir a BigQuery.
+        """
+        staleness = self.staleness_s()
+        if staleness > self.refresh_after_s and not self._refresh_lock.locked():
+            self._refresh_in_background()
+        if staleness > self.max_staleness_s:
+            return None
+        lowered = [s.lower() for s in statuses]
+        try:
+            cursor = self._connection().execute(
+                f"SELECT {', '.join(REPLICA_COLUMNS)} FROM travel_requests "
+                f"WHERE status_lower IN ({', '.join('?' * len(lowered))}) ORDER BY timestamp DESC LIMIT ?",
+                (*lowered, limit))
+            return [self._to_row(values) for values in cursor.fetchall()]
+        except sqlite3.Error:
+            _log.warning("Error al leer la réplica local; se consulta BigQuery", exc_info=True)
+            return None
+
+    @staticmethod
+    def _to_row(values: Sequence[Optional[str]]) -> ReplicaRow:
+        row = ReplicaRow(*values)
+        if row.timestamp:
+            row = row._replace(timestamp=datetime.datetime.strptime(row.timestamp, _TS_FORMAT)
+                               .replace(tzinfo=datetime.timezone.utc))
+        return row
+
+
+def create_replica_from_env(client_getter: Callable[[], bigquery.Client], table_ref: str) -> Optional[TravelReadReplica]:
+    """Crea la réplica si READ_REPLICA_PATH está definido y lanza la primera carga en segundo plano.
+    Si el fichero no se puede abrir o crear devuelve None (siempre BigQuery): la réplica es una
+    caché opcional y no debe impedir que se importe el webhook o el agente.
+    """
+    if not READ_REPLICA_PATH:
+        return None
+    try:
+        replica = TravelReadReplica(READ_REPLICA_PATH, client_getter, table_ref)
+    except sqlite3.Error:
+        _log.warning("No se pudo abrir la réplica local en '%s'; se consulta BigQuery", READ_REPLICA_PATH, exc_info=True)
+        return None
+    replica._refresh_in_background()
+    return replica
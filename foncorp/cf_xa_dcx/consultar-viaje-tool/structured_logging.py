@@ -0,0 +1,223 @@
+# structured_logging.py
+# Logging estructurado (una línea JSON por registro, que Cloud Logging interpreta con su
+# 'severity') con muestreo por nivel/endpoint, redacción de PII y escritura en segundo plano.
+# Sustituye a los print() de las peticiones, que hacían I/O síncrona a stdout en el camino
+# crítico, inflaban la ingesta de logs y volcaban datos personales. Este fichero se copia tal
+# cual en cada Cloud Function y en el paquete del agente (cada función se despliega desde su
+# propio directorio): mantener las copias idénticas.
+#
+# Configuración (variables de entorno):
+#   LOG_LEVEL            Nivel mínimo (por defecto INFO).
+#   LOG_SAMPLE_RATES     Fracción de registros que se emiten, por nivel y opcionalmente por
+#                        endpoint: "INFO=0.1,consultar_viajes_tool_webhook:INFO=1". Lo no
+#                        indicado se emite siempre. WARNING y superiores conviene dejarlos a 1.
+#   LOG_REDACT_FIELDS    Campos cuyo valor se sustituye por "[REDACTED]" (lista separada por comas).
+#   LOG_MAX_FIELD_CHARS  Longitud máxima de cada texto registrado (por defecto 256).
+#   LOG_QUEUE_SIZE       Registros pendientes máximos; si la cola se llena se descartan.
+import atexit
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+# Una configuración mal formada no debe impedir que arranque la instancia: se usa el valor por
+# defecto y se avisa con un WARNING al configurar el logger.
+_INVALID_SETTINGS: List[str] = []
+
+
+def _env_level(name: str, default: str) -> str:
+    value = os.environ.get(name, default).strip().upper()
+    if isinstance(logging.getLevelName(value), int):
+        return value
+    _INVALID_SETTINGS.append(f"{name}={value}")
+    return default
+
+
+def _env_positive_int(name: str, default: int) -> int:
+    value = os.environ.get(name, str(default))
+    try:
+        parsed = int(value)
+    except ValueError:
+        parsed = 0
+    if parsed > 0:
+        return parsed
+    _INVALID_SETTINGS.append(f"{name}={value}")
+    return default
+
+
+LOG_LEVEL = _env_level("LOG_LEVEL", "INFO")
+LOG_MAX_FIELD_CHARS = _env_positive_int("LOG_MAX_FIELD_CHARS", 256)
+LOG_MAX_ITEMS = 20 # Elementos máximos registrados de una lista o dict
+LOG_QUEUE_SIZE = _env_positive_int("LOG_QUEUE_SIZE", 10000)
+REDACT_FIELDS = frozenset(
+    f.strip() for f in os.environ.get(
+        # Las respuestas de registro y consulta repiten nombres e IDs de empleados
+        "LOG_REDACT_FIELDS", "employee_first_name,employee_last_name,employee_id,reason,"
+                             "tool_response_message,query_results_string"
+    ).split(",") if f.strip()
+)
+REDACTED = "[REDACTED]"
+
+
+def _parse_sample_rates(spec: str) -> Dict[Tuple[Optional[str], int], float]:
+    """'INFO=0.1,ep:DEBUG=0' -> {(None, 20): 0.1, ('ep', 10): 0.0}.
+    Las entradas mal formadas se ignoran y se añaden a _INVALID_SETTINGS.
+    """
+    rates: Dict[Tuple[Optional[str], int], float] = {}
+    for entry in spec.split(","):
+        if not entry.strip():
+            continue
+        key, _, rate = entry.partition("=")
+        endpoint, _, level_name = key.strip().rpartition(":")
+        level = logging.getLevelName(level_name.upper())
+        try:
+            rate_value = float(rate)
+        except ValueError:
+            rate_value = None
+        if not isinstance(level, int) or rate_value is None or rate_value != rate_value: # NaN
+            _INVALID_SETTINGS.append(f"LOG_SAMPLE_RATES:{entry.strip()}")
+            continue
+        rates[(endpoint or None, level)] = max(0.0, min(1.0, rate_value))
+    return rates
+
+
+_SAMPLE_RATES = _parse_sample_rates(os.environ.get("LOG_SAMPLE_RATES", ""))
+
+
+def _sanitize(value: Any, depth: int = 0) -> Any:
+    """Redacta campos de PII, trunca textos largos y limita el tamaño de colecciones."""
+    if isinstance(value, str):
+        if len(value) > LOG_MAX_FIELD_CHARS:
+            return f"{value[:LOG_MAX_FIELD_CHARS]}...[+{len(value) - LOG_MAX_FIELD_CHARS} chars]"
+        return value
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if depth >= 3:
+        return f"<{type(value).__name__}>"
+    if isinstance(value, dict):
+        return {
+            str(k): (REDACTED if k in REDACT_FIELDS and v is not None else _sanitize(v, depth + 1))
+            for k, v in list(value.items())[:LOG_MAX_ITEMS]
+        }
+    if isinstance(value, (list, tuple)):
+        return [_sanitize(v, depth + 1) for v in value[:LOG_MAX_ITEMS]]
+    return _sanitize(str(value), depth)
+
+
+class _JsonFormatter(logging.Formatter):
+    """Formatea en el hilo del QueueListener: la sanitización y el json.dumps salen del camino crítico."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "severity": record.levelname,
+            "message": record.getMessage(),
+            "timestamp": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            "endpoint": getattr(record, "endpoint", record.name),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            for key, value in fields.items():
+                entry[key] = REDACTED if key in REDACT_FIELDS and value is not None else _sanitize(value)
+        dropped = _NonBlockingQueueHandler.take_dropped()
+        if dropped:
+            entry["dropped_log_records"] = dropped
+        if record.exc_info:
+            # De una traza interesa el final (la excepción y el frame que la lanzó)
+            trace = self.formatException(record.exc_info)
+            limit = LOG_MAX_FIELD_CHARS * 4
+            entry["exception"] = trace if len(trace) <= limit else f"...[-{len(trace) - limit} chars]{trace[-limit:]}"
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler que nunca bloquea ni formatea en el hilo de la petición."""
+
+    # Los hilos de las peticiones incrementan y el hilo del listener lee y pone a cero:
+    # sin el lock se perderían descartes con varias peticiones concurrentes.
+    _dropped = 0
+    _dropped_lock = threading.Lock()
+
+    @classmethod
+    def take_dropped(cls) -> int:
+        """Registros descartados desde la última llamada."""
+        with cls._dropped_lock:
+            dropped, cls._dropped = cls._dropped, 0
+        return dropped
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # El QueueHandler estándar formatea aquí; lo dejamos para el _JsonFormatter del listener.
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with _NonBlockingQueueHandler._dropped_lock: # Mejor perder un log que bloquear la petición
+                _NonBlockingQueueHandler._dropped += 1
+
+
+def _configure() -> logging.Logger:
+    base = logging.getLogger("foncorp")
+    if base.handlers: # Ya configurado (p.ej. módulo importado dos veces)
+        return base
+    base.setLevel(LOG_LEVEL)
+    base.propagate = False
+    stdout_handler = logging.StreamHandler(sys.stdout)
+    stdout_handler.setFormatter(_JsonFormatter())
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    base.addHandler(_NonBlockingQueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, stdout_handler, respect_handler_level=False)
+    listener.start()
+    atexit.register(listener.stop) # Vaciar la cola al terminar la instancia
+    return base
+
+
+_base_logger = _configure()
+if _INVALID_SETTINGS:
+    _base_logger.warning("Configuración de logging mal formada ignorada (se usan los valores por defecto): %s",
+                         ", ".join(_INVALID_SETTINGS))
+
+
+class StructuredLogger:
+    """Logger de un endpoint. Los campos extra se pasan como kwargs y se sanitizan al escribir:
+        log.info("Petición recibida", payload=request_json)
+    """
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self._logger = _base_logger.getChild(endpoint)
+        self._rates = {
+            level: _SAMPLE_RATES.get((endpoint, level), _SAMPLE_RATES.get((None, level), 1.0))
+            for level in (logging.DEBUG, logging.INFO, logging.WARNING, logging.ERROR, logging.CRITICAL)
+        }
+
+    def _log(self, level: int, message: str, exc_info: bool, fields: Dict[str, Any]) -> None:
+        if not self._logger.isEnabledFor(level):
+            return
+        rate = self._rates.get(level, 1.0)
+        if rate < 1.0 and random.random() >= rate:
+            return
+        self._logger.log(level, message, exc_info=exc_info,
+                         extra={"endpoint": self.endpoint, "fields": fields})
+
+    def debug(self, message: str, **fields: Any) -> None:
+        self._log(logging.DEBUG, message, False, fields)
+
+    def info(self, message: str, **fields: Any) -> None:
+        self._log(logging.INFO, message, False, fields)
+
+    def warning(self, message: str, **fields: Any) -> None:
+        self._log(logging.WARNING, message, False, fields)
+
+    def error(self, message: str, exc_info: bool = False, **fields: Any) -> None:
+        self._log(logging.ERROR, message, exc_info, fields)
+
+
+def get_logger(endpoint: str) -> StructuredLogger:
+    return StructuredLogger(endpoint)
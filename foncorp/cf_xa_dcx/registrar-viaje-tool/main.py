@@ -5,12 +5,42 @@ import uuid
 import datetime
 from typing import Optional, Dict, Any
 import os
+import threading
+
+from openapi_validator import RequestValidationError, compile_request_validator
+from request_profiling import profiled_webhook
+from structured_logging import get_logger
 
 # --- Configuración de BigQuery ---
 # Leer de variables de entorno (se configuran al desplegar la Cloud Function)
 BIGQUERY_PROJECT_ID = os.environ.get("BIGQUERY_PROJECT_ID", "fon-test-project") # Tu proyecto
 BIGQUERY_DATASET_ID = os.environ.get("BIGQUERY_DATASET_ID", "foncorp_travel_data")
 BIGQUERY_TABLE_ID = os.environ.get("BIGQUERY_TABLE_ID", "travel_requests") # Tabla con nuevo esquema
+TABLE_REF_STR = f"{BIGQUERY_PROJECT_ID}.{BIGQUERY_DATASET_ID}.{BIGQUERY_TABLE_ID}"
+
+# Logging estructurado, muestreado y en segundo plano (ver structured_logging.py)
+log = get_logger("registrar_viaje_tool_webhook")
+
+# --- Cliente de BigQuery compartido ---
+# Con --concurrency > 1 la instancia atiende varias peticiones a la vez (hilos gthread de
+# functions-framework), así que se reutiliza un único cliente por proceso en lugar de
+# crear uno (y su pool de conexiones) en cada llamada. bigquery.Client es thread-safe.
+_bq_client: Optional[bigquery.Client] = None
+_bq_client_lock = threading.Lock()
+
+def _get_bq_client() -> bigquery.Client:
+    """Devuelve el cliente de BigQuery del proceso, creándolo la primera vez que se pide."""
+    global _bq_client
+    if _bq_client is None:
+        with _bq_client_lock:
+            if _bq_client is None:
+                _bq_client = bigquery.Client(project=BIGQUERY_PROJECT_ID)
+    return _bq_client
+
+# --- Validación de entrada ---
+# El esquema del requestBody de la spec OpenAPI se compila una vez al arrancar la instancia.
+_validate_request = compile_request_validator(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "openapi_registrar_viaje.yaml"))
 
 # --- Lógica de Negocio Interna (similar a la que ya teníamos en ADK) ---
 def _register_travel_in_bq(
@@ -28,36 +58,26 @@ def _register_travel_in_bq(
     """Registra una solicitud de viaje en BigQuery usando DML INSERT.
     Devuelve un diccionario con 'status_message' y opcionalmente 'request_id'.
     """
-    try:
-        # Validación de fechas
-        date_format = "%Y-%m-%d"
-        current_date_obj = datetime.datetime.now().date()
-        start_date_obj = datetime.datetime.strptime(start_date, date_format).date()
-        end_date_obj = datetime.datetime.strptime(end_date, date_format).date()
-
-        if start_date_obj < current_date_obj:
-            return {"status_message": f"Error en la herramienta: La fecha de inicio '{start_date}' ya ha pasado."}
-        if end_date_obj < current_date_obj:
-             return {"status_message": f"Error en la herramienta: La fecha de fin '{end_date}' ya ha pasado."}
-        if end_date_obj < start_date_obj:
-            return {"status_message": "Error en la herramienta: La fecha de fin no puede ser anterior a la fecha de inicio."}
-    except ValueError:
-        return {"status_message": "Error en la herramienta: El formato de las fechas no es válido. Utiliza YYYY-MM-DD."}
-    except Exception as e: # Captura otras excepciones de parseo de fechas
-        print(f"Error de validación de fechas: {e}")
-        return {"status_message": f"Error de validación de fechas: {str(e)}."}
-
+    # El formato YYYY-MM-DD ya lo ha comprobado el validador OpenAPI; aquí solo las reglas de negocio.
+    current_date_obj = datetime.date.today()
+    start_date_obj = datetime.date.fromisoformat(start_date)
+    end_date_obj = datetime.date.fromisoformat(end_date)
+
+    if start_date_obj < current_date_obj:
+        return {"status_message": f"Error en la herramienta: La fecha de inicio '{start_date}' ya ha pasado."}
+    if end_date_obj < current_date_obj:
+         return {"status_message": f"Error en la herramienta: La fecha de fin '{end_date}' ya ha pasado."}
+    if end_date_obj < start_date_obj:
+        return {"status_message": "Error en la herramienta: La fecha de fin no puede ser anterior a la fecha de inicio."}
 
     try:
-        # Usar el project_id configurado para el cliente de BQ
-        client = bigquery.Client(project=BIGQUERY_PROJECT_ID)
+        client = _get_bq_client()
         request_id_val = str(uuid.uuid4())
         current_timestamp = datetime.datetime.now(datetime.timezone.utc)
         initial_status = "Registrada" # Esquema v2
-        table_ref_str = f"{BIGQUERY_PROJECT_ID}.{BIGQUERY_DATASET_ID}.{BIGQUERY_TABLE_ID}"
 
         query = f"""
-            INSERT INTO `{table_ref_str}` (
+            INSERT INTO `{TABLE_REF_STR}` (
                 request_id, timestamp, employee_first_name, employee_last_name, employee_id,
                 origin_city, destination_city, start_date, end_date,
                 transport_mode, car_type, reason, status
@@ -89,7 +109,7 @@ def _register_travel_in_bq(
 
         if query_job.errors:
             error_messages = "; ".join([str(error["message"]) for error in query_job.errors])
-            print(f"ERROR BQ DML en _register_travel_in_bq: {error_messages}")
+            log.error("Error BQ DML en _register_travel_in_bq", errors=error_messages)
             return {"status_message": f"Error al registrar la solicitud en BigQuery: {error_messages}."}
         else:
             if query_job.num_dml_affected_rows is not None and query_job.num_dml_affected_rows > 0:
@@ -102,14 +122,15 @@ def _register_travel_in_bq(
                 )
                 return {"status_message": confirmation_message, "request_id": request_id_val}
             else:
-                print(f"ERROR BQ DML en _register_travel_in_bq: No se afectaron filas.")
+                log.error("Error BQ DML en _register_travel_in_bq: no se afectaron filas")
                 return {"status_message": "Error al registrar la solicitud: no se insertaron filas."}
     except Exception as e:
-        print(f"ERROR GENERAL en _register_travel_in_bq: {e}")
+        log.error("Error general en _register_travel_in_bq", exc_info=True)
         return {"status_message": f"Error técnico al registrar la solicitud: {str(e)}."}
 
 # Punto de entrada para la Cloud Function HTTP de 2ª Generación
 @functions_framework.http
+@profiled_webhook
 def registrar_viaje_tool_webhook(request: flask.Request) -> flask.Response:
     """Cloud Function HTTP para registrar una solicitud de viaje.
     Espera un JSON con los parámetros definidos en la OpenAPI spec de la tool.
@@ -129,30 +150,17 @@ def registrar_viaje_tool_webhook(request: flask.Request) -> flask.Response:
         if not request_json:
             return flask.make_response(flask.jsonify({"error": "Solicitud JSON inválida o vacía"}), 400)
 
-        print(f"Request JSON recibido: {request_json}") # Para depuración
-
-        # Extraer argumentos esperados, manejando los opcionales
-        # Los nombres aquí deben coincidir con las propiedades definidas en el requestBody de la OpenAPI spec
-        args = {
-            "employee_first_name": request_json.get("employee_first_name"),
-            "employee_last_name": request_json.get("employee_last_name"),
-            "employee_id": request_json.get("employee_id"),
-            "origin_city": request_json.get("origin_city"),
-            "destination_city": request_json.get("destination_city"),
-            "start_date": request_json.get("start_date"),
-            "end_date": request_json.get("end_date"),
-            "transport_mode": request_json.get("transport_mode"),
-            "reason": request_json.get("reason"),
-            "car_type": request_json.get("car_type") # Será None si no está presente
-        }
+        log.info("Request JSON recibido", payload=request_json) # PII redactada (ver structured_logging.py)
 
-        required_fields = ["employee_first_name", "employee_last_name", "employee_id", "origin_city",
-                           "destination_city", "start_date", "end_date", "transport_mode", "reason"]
-        missing_fields = [field for field in required_fields if args.get(field) is None]
-        if missing_fields:
+        # Validar contra el requestBody de la OpenAPI spec: campos requeridos, tipos,
+        # formato de fechas y enum de transport_mode (devuelto con su valor canónico).
+        # Las claves de 'args' coinciden con las propiedades definidas en la spec.
+        try:
+            args = _validate_request(request_json)
+        except RequestValidationError as e:
             # Para Playbook tools, la respuesta debe ser un JSON que el playbook pueda interpretar.
             # Devolver un error claro es útil.
-            return flask.make_response(flask.jsonify({"tool_response_message": f"Faltan campos requeridos para la herramienta: {', '.join(missing_fields)}"}), 400)
+            return flask.make_response(flask.jsonify({"tool_response_message": f"Solicitud inválida para la herramienta: {e}"}), 400)
 
         # Llamar a la lógica de negocio
         result_dict = _register_travel_in_bq(**args)
@@ -171,11 +179,11 @@ def registrar_viaje_tool_webhook(request: flask.Request) -> flask.Response:
         # }
         # Por ahora, mantendremos la estructura con 'tool_response_message'.
 
-        print(f"Respuesta del webhook: {playbook_tool_response}")
+        log.info("Respuesta del webhook", response=playbook_tool_response)
         return flask.jsonify(playbook_tool_response)
 
     except Exception as e:
-        print(f"Error general en el webhook registrar_viaje_tool_webhook: {e}")
+        log.error("Error general en el webhook", exc_info=True)
         # Respuesta de error genérica para Dialogflow
         error_response_payload = {
             "tool_response_message": f"Error interno crítico en la herramienta de registro: {str(e)}"
@@ -0,0 +1,31 @@
+# Comprueba que las copias de los módulos y specs OpenAPI compartidos son idénticas en todas las
+# Cloud Functions y en el paquete del agente (cada uno se despliega desde su propio directorio,
+# así que cada uno lleva su copia). Los deploy.sh lo ejecutan antes de desplegar; también se
+# puede lanzar a mano desde cualquier directorio. Sale con código 1 si alguna copia diverge.
+cd "$(dirname "$0")" || exit 1
+AGENT=mi_agente_de_viajes/sistema_de_reservas
+status=0
+
+# check <referencia> <copia>...: cada copia debe existir y ser idéntica byte a byte a la referencia
+check() {
+  reference=$1
+  shift
+  for copy in "$@"; do
+    if ! cmp -s "${reference}" "${copy}"; then
+      echo "Copia divergente o ausente: ${copy} (referencia: ${reference})" >&2
+      status=1
+    fi
+  done
+}
+
+for module in openapi_validator.py structured_logging.py request_profiling.py; do
+  check cf_xa_dcx/consultar-viaje-tool/${module} cf_xa_dcx/*/${module} ${AGENT}/${module}
+done
+check cf_xa_dcx/consultar-viaje-tool/read_replica.py ${AGENT}/read_replica.py
+check cf_xa_dcx/analizar-viajes-tool/travel_analytics.py ${AGENT}/travel_analytics.py
+# Specs: la de cada Cloud Function es la referencia de la copia del agente (mismas tablas de enums)
+for spec in cf_xa_dcx/*/openapi_*.yaml; do
+  check "${spec}" ${AGENT}/$(basename "${spec}")
+done
+
+exit ${status}
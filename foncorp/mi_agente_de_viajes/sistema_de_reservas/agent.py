@@ -1,13 +1,20 @@
 # mi_agente_de_viajes/sistema_de_reservas/agent.py
 from google.adk.agents import LlmAgent
-from pydantic import BaseModel, Field
-from typing import Optional
+from pydantic import BaseModel, Field, ValidationError, model_validator
+from typing import Any, List, Optional
+import os
+import threading
 
 # Importaciones para BigQuery
 from google.cloud import bigquery
 import uuid
 import datetime
 
+from .openapi_validator import compile_request_validator
+from .read_replica import create_replica_from_env
+from .request_profiling import profiled_tool
+from .structured_logging import get_logger
+
 # --- Configuración del Modelo ---
 MODEL_ID = "gemini-2.0-flash-001"
 
@@ -15,6 +22,33 @@ MODEL_ID = "gemini-2.0-flash-001"
 BIGQUERY_PROJECT_ID = "fon-test-project"
 BIGQUERY_DATASET_ID = "foncorp_travel_data"
 BIGQUERY_TABLE_ID = "travel_requests"
+TABLE_REF_STR = f"{BIGQUERY_PROJECT_ID}.{BIGQUERY_DATASET_ID}.{BIGQUERY_TABLE_ID}"
+
+# Logging estructurado, muestreado y en segundo plano (ver structured_logging.py), un logger por herramienta
+_booking_log = get_logger("request_travel_booking_logic")
+_get_requests_log = get_logger("get_travel_requests_by_status")
+_update_log = get_logger("update_travel_request_status")
+_analytics_log = get_logger("get_travel_analytics")
+
+# --- Cliente de BigQuery compartido ---
+# El runtime de ADK puede ejecutar varias llamadas a herramientas en paralelo (hilos),
+# así que se reutiliza un único cliente por proceso en vez de crear uno por llamada.
+_bq_client: Optional[bigquery.Client] = None
+_bq_client_lock = threading.Lock()
+
+def _get_bq_client() -> bigquery.Client:
+    """Devuelve el cliente de BigQuery del proceso, creándolo la primera vez que se pide."""
+    global _bq_client
+    if _bq_client is None:
+        with _bq_client_lock:
+            if _bq_client is None:
+                _bq_client = bigquery.Client()
+    return _bq_client
+
+# --- Réplica local opcional (ver read_replica.py) ---
+# Si READ_REPLICA_PATH está definido, las consultas por estado se sirven desde un SQLite local
+# sincronizado de forma incremental; BigQuery queda como respaldo cuando la réplica es antigua.
+_replica = create_replica_from_env(_get_bq_client, TABLE_REF_STR)
 
 # --- Definición del Prompt ---
 TRAVEL_AGENT_INSTRUCTION = f"""
@@ -25,6 +59,7 @@ Tus responsabilidades principales son:
 - Registrar nuevas solicitudes de viaje.
 - Consultar el estado de las solicitudes de viaje existentes.
 - Actualizar el estado de una solicitud de viaje específica.
+- Calcular estadísticas de viajes (número de viajes, días totales y medios, desgloses por destino, transporte y estado).
 
 Estados Comunes de Solicitudes y sus Significados (para tu conocimiento interno y para interpretar consultas):
 - 'Registrada': Solicitudes nuevas. Si el usuario pregunta por "pendientes", "nuevas", o "sin revisar", podría referirse a este estado o a una combinación con 'Pendiente de Aprobación'.
@@ -57,6 +92,12 @@ Instrucciones para las herramientas:
    - Pregunta al usuario por estos datos si no los proporciona. Asegúrate de que 'new_status' sea uno de los estados válidos listados arriba.
    - Llama a la herramienta 'update_travel_request_status' con los argumentos: request_id (str) y new_status (str).
 
+4. Para preguntas de estadísticas o recuentos (ej. "¿cuántos viajes a Madrid en tren este trimestre y cuántos días en total?"):
+   - NO uses 'get_travel_requests_by_status' para contar: llama a la herramienta 'get_travel_analytics'.
+   - Argumentos opcionales: destination_city (str), transport_mode (str), status (str), start_date_from (str,<y_bin_46>MM-DD) y start_date_to (str,<y_bin_46>MM-DD). Traduce periodos como "este trimestre" o "este año" a start_date_from/start_date_to a partir de la fecha actual.
+   - Sin 'status', las cifras NO incluyen solicitudes Rechazadas ni Canceladas (el resumen lo indica); para contarlas, pasa ese estado en 'status'.
+   - Presenta al usuario el resumen devuelto; no inventes cifras que no estén en él. Si un desglose incluye "otros", menciónalo: la lista no es completa.
+
 Reglas Generales:
 - NO inventes información para las herramientas. Pide al usuario cualquier dato que falte.
 - Informa al usuario del resultado después de cada llamada a herramienta.
@@ -64,7 +105,24 @@ Reglas Generales:
 - La fecha actual es: {datetime.datetime.now().strftime('%Y-%m-%d')}. Considera esto para inferir años si el usuario solo da día y mes para las fechas de viaje.
 """
 
-# --- (Opcional) Pydantic para claridad de argumentos ---
+# --- Validadores compartidos con los webhooks ---
+# Se compilan una vez, al importar el agente, a partir de las mismas specs OpenAPI que usan
+# las Cloud Functions (tablas de estados y medios de transporte incluidas), de modo que una
+# llamada inválida del LLM falla igual y con el mismo mensaje en ambos lados, sin tocar BigQuery.
+# Las specs se copian tal cual junto a este fichero (el despliegue del agente solo incluye este
+# paquete); check-shared-copies.sh falla si divergen de las de cf_xa_dcx. OPENAPI_SPECS_DIR
+# permite leerlas de otro directorio.
+OPENAPI_SPECS_DIR = os.environ.get("OPENAPI_SPECS_DIR", os.path.dirname(os.path.abspath(__file__)))
+_validate_booking_args = compile_request_validator(os.path.join(OPENAPI_SPECS_DIR, "openapi_registrar_viaje.yaml"))
+_validate_get_requests_args = compile_request_validator(os.path.join(OPENAPI_SPECS_DIR, "openapi_consultar_viajes.yaml"))
+_validate_update_args = compile_request_validator(os.path.join(OPENAPI_SPECS_DIR, "openapi_actualiza_viaje.yaml"))
+_validate_analytics_args = compile_request_validator(os.path.join(OPENAPI_SPECS_DIR, "openapi_analizar_viajes.yaml"))
+
+def _validation_error_message(error: ValidationError) -> str:
+    """Recupera los mensajes del RequestValidationError original que pydantic envuelve."""
+    return " ".join(str(err.get("ctx", {}).get("error", err["msg"])) for err in error.errors())
+
+# --- Pydantic para claridad y validación de argumentos ---
 class _TravelBookingArgsSchema(BaseModel):
     employee_first_name: str = Field(description="Nombre del empleado (pila).")
     employee_last_name: str = Field(description="Apellidos del empleado.")
@@ -77,15 +135,43 @@ class _TravelBookingArgsSchema(BaseModel):
     reason: str = Field(description="Motivo del viaje.")
     car_type: Optional[str] = Field(default=None, description="Tipo de coche si es 'Coche' (Particular o Alquiler).")
 
+    @model_validator(mode="before")
+    @classmethod
+    def _check_openapi(cls, data: Any) -> Any:
+        return _validate_booking_args(data)
+
 class _GetTravelRequestsArgsSchema(BaseModel):
     search_term: str = Field(description="El estado o término de búsqueda para las solicitudes.")
 
+    @model_validator(mode="before")
+    @classmethod
+    def _check_openapi(cls, data: Any) -> Any:
+        return _validate_get_requests_args(data)
+
 class _UpdateTravelRequestArgsSchema(BaseModel):
     request_id: str = Field(description="ID de la solicitud a actualizar.")
     new_status: str = Field(description="Nuevo estado para la solicitud.")
 
+    @model_validator(mode="before")
+    @classmethod
+    def _check_openapi(cls, data: Any) -> Any:
+        return _validate_update_args(data)
+
+class _TravelAnalyticsArgsSchema(BaseModel):
+    destination_city: Optional[str] = Field(default=None, description="Ciudad de destino.")
+    transport_mode: Optional[str] = Field(default=None, description="Medio de transporte.")
+    status: Optional[str] = Field(default=None, description="Estado de la solicitud.")
+    start_date_from: Optional[str] = Field(default=None, description="Inicio del periodo (fecha de inicio del viaje) en formato<y_bin_46>MM-DD.")
+    start_date_to: Optional[str] = Field(default=None, description="Fin del periodo (fecha de inicio del viaje) en formato<y_bin_46>MM-DD.")
+
+    @model_validator(mode="before")
+    @classmethod
+    def _check_openapi(cls, data: Any) -> Any:
+        return _validate_analytics_args(data)
+
 
 # --- Lógica de la Herramienta 1: Registrar Solicitud (Usa DML INSERT) ---
+@profiled_tool
 def request_travel_booking_logic(
     employee_first_name: str,
     employee_last_name: str,
@@ -116,29 +202,35 @@ def request_travel_booking_logic(
         str: Mensaje de confirmación o error.
     """
     try:
-        date_format = "%Y-%m-%d"
-        current_date_obj = datetime.datetime.now().date()
-        start_date_obj = datetime.datetime.strptime(start_date, date_format).date()
-        end_date_obj = datetime.datetime.strptime(end_date, date_format).date()
-
-        if start_date_obj < current_date_obj:
-            return f"Error en la herramienta: La fecha de inicio '{start_date}' ya ha pasado."
-        if end_date_obj < current_date_obj:
-             return f"Error en la herramienta: La fecha de fin '{end_date}' ya ha pasado."
-        if end_date_obj < start_date_obj:
-            return "Error en la herramienta: La fecha de fin no puede ser anterior a la fecha de inicio."
-    except ValueError:
-        return "Error en la herramienta: El formato de las fechas no es válido. Utiliza<y_bin_46>MM-DD."
+        args = _TravelBookingArgsSchema(
+            employee_first_name=employee_first_name, employee_last_name=employee_last_name,
+            employee_id=employee_id, origin_city=origin_city, destination_city=destination_city,
+            start_date=start_date, end_date=end_date, transport_mode=transport_mode,
+            reason=reason, car_type=car_type)
+    except ValidationError as e:
+        return f"Error en la herramienta: {_validation_error_message(e)}"
+    transport_mode = args.transport_mode # Valor canónico del enum (ej. 'avion' -> 'Avión')
+
+    # El formato de las fechas ya está validado; aquí solo las reglas de negocio.
+    current_date_obj = datetime.date.today()
+    start_date_obj = datetime.date.fromisoformat(start_date)
+    end_date_obj = datetime.date.fromisoformat(end_date)
+
+    if start_date_obj < current_date_obj:
+        return f"Error en la herramienta: La fecha de inicio '{start_date}' ya ha pasado."
+    if end_date_obj < current_date_obj:
+         return f"Error en la herramienta: La fecha de fin '{end_date}' ya ha pasado."
+    if end_date_obj < start_date_obj:
+        return "Error en la herramienta: La fecha de fin no puede ser anterior a la fecha de inicio."
 
     try:
-        client = bigquery.Client()
+        client = _get_bq_client()
         request_id_val = str(uuid.uuid4())
         current_timestamp = datetime.datetime.now(datetime.timezone.utc)
         initial_status = "Registrada"
-        table_ref_str = f"{BIGQUERY_PROJECT_ID}.{BIGQUERY_DATASET_ID}.{BIGQUERY_TABLE_ID}"
 
         query = f"""
-            INSERT INTO `{table_ref_str}` (
+            INSERT INTO `{TABLE_REF_STR}` (
                 request_id, timestamp, employee_first_name, employee_last_name, employee_id,
                 origin_city, destination_city, start_date, end_date,
                 transport_mode, car_type, reason, status
@@ -170,7 +262,7 @@ def request_travel_booking_logic(
 
         if query_job.errors:
             error_messages = "; ".join([str(error["message"]) for error in query_job.errors])
-            print(f"[LOG request_travel_booking_logic - ERROR BQ DML]: {error_messages}")
+            _booking_log.error("Error BQ DML", errors=error_messages)
             return f"Error al registrar la solicitud (DML): {error_messages}."
         else:
             if query_job.num_dml_affected_rows is not None and query_job.num_dml_affected_rows > 0:
@@ -181,16 +273,54 @@ def request_travel_booking_logic(
                     f"({start_date} a {end_date}), usando {transport_mode}"
                     f"{f' ({car_type})' if car_type and transport_mode.lower() == 'coche' else ''}. Motivo: {reason}."
                 )
-                print(f"[LOG request_travel_booking_logic]: {confirmation_message}")
+                _booking_log.info("Solicitud registrada", request_id=request_id_val)
+                if _replica:
+                    _replica.invalidate() # La siguiente consulta debe ver esta solicitud
                 return confirmation_message
             else:
-                print(f"[LOG request_travel_booking_logic - ERROR BQ DML]: No se afectaron filas.")
+                _booking_log.error("Error BQ DML: no se afectaron filas")
                 return "Error al registrar la solicitud: no se insertaron filas."
     except Exception as e:
-        print(f"[LOG request_travel_booking_logic - ERROR]: {e}")
+        _booking_log.error("Error técnico al registrar la solicitud", exc_info=True)
         return f"Error técnico al registrar la solicitud: {e}."
 
 # --- Lógica de la Herramienta 2: Consultar Solicitudes por Estado (Devuelve Markdown) ---
+def _resolve_search_statuses(search_term: str) -> List[str]:
+    """Interpreta el search_term y devuelve los estados a buscar (lista vacía si no se entiende)."""
+    statuses: List[str] = []
+    processed_search_term = search_term.lower().strip()
+
+    if "pendiente" in processed_search_term or \
+       "sin aprobar" in processed_search_term or \
+       "nuevas" in processed_search_term or \
+       ("registrada" in processed_search_term and "aprobaci" not in processed_search_term) :
+        statuses.append("Registrada")
+        if "aprobaci" in processed_search_term or "pendiente" in processed_search_term :
+            statuses.append("Pendiente de Aprobación")
+
+    exact_final_statuses = ["aprobada", "rechazada", "reservada", "completada", "cancelada"]
+    if processed_search_term in exact_final_statuses or \
+       (not statuses and processed_search_term):
+        statuses = [search_term.strip().capitalize()]
+    return statuses
+
+def _get_rows_by_statuses_from_bq(statuses: List[str]) -> List[Any]:
+    """Las 10 solicitudes más recientes con alguno de los estados, leídas de BigQuery."""
+    status_conditions = [f"LOWER(status) = LOWER(@status_param_{i})" for i in range(1, len(statuses) + 1)]
+    query_params = [bigquery.ScalarQueryParameter(f"status_param_{i}", "STRING", status)
+                    for i, status in enumerate(statuses, start=1)]
+    where_clause = " OR ".join(status_conditions)
+    # Seleccionamos campos para la tabla
+    query = f"""
+        SELECT request_id, employee_first_name, employee_last_name, 
+               destination_city, start_date, end_date, status
+        FROM `{TABLE_REF_STR}` WHERE {where_clause} ORDER BY timestamp DESC LIMIT 10
+    """
+    job_config = bigquery.QueryJobConfig(query_parameters=query_params)
+    query_job = _get_bq_client().query(query, job_config=job_config)
+    return list(query_job.result())
+
+@profiled_tool
 def get_travel_requests_by_status(search_term: str) -> str:
     """Consulta solicitudes de viaje. Puede buscar por un estado exacto o interpretar términos comunes como 'pendientes'.
     Devuelve los resultados en formato de tabla Markdown.
@@ -202,60 +332,26 @@ def get_travel_requests_by_status(search_term: str) -> str:
         str: Una cadena formateada como tabla Markdown con las solicitudes encontradas o un mensaje si no hay ninguna o si ocurre un error.
     """
     try:
-        client = bigquery.Client()
-        table_ref_str = f"{BIGQUERY_PROJECT_ID}.{BIGQUERY_DATASET_ID}.{BIGQUERY_TABLE_ID}"
-        status_conditions = []
-        query_params = []
-        param_counter = 0
-        processed_search_term = search_term.lower().strip()
-
-        if "pendiente" in processed_search_term or \
-           "sin aprobar" in processed_search_term or \
-           "nuevas" in processed_search_term or \
-           ("registrada" in processed_search_term and "aprobaci" not in processed_search_term) :
-            
-            param_counter += 1
-            status_conditions.append(f"LOWER(status) = LOWER(@status_param_{param_counter})")
-            query_params.append(bigquery.ScalarQueryParameter(f"status_param_{param_counter}", "STRING", "Registrada"))
-            
-            if "aprobaci" in processed_search_term or "pendiente" in processed_search_term :
-                 param_counter += 1
-                 if not any(p.value.lower() == "pendiente de aprobación" for p in query_params):
-                    status_conditions.append(f"LOWER(status) = LOWER(@status_param_{param_counter})")
-                    query_params.append(bigquery.ScalarQueryParameter(f"status_param_{param_counter}", "STRING", "Pendiente de Aprobación"))
-        
-        exact_final_statuses = ["aprobada", "rechazada", "reservada", "completada", "cancelada"]
-        if processed_search_term in exact_final_statuses or \
-           (not status_conditions and processed_search_term):
-            status_conditions = [] 
-            query_params = []
-            param_counter = 0
-            
-            param_counter += 1
-            status_conditions.append(f"LOWER(status) = LOWER(@status_param_{param_counter})")
-            query_params.append(bigquery.ScalarQueryParameter(f"status_param_{param_counter}", "STRING", search_term.strip().capitalize()))
-
-        if not status_conditions:
-             print(f"[LOG get_travel_requests_by_status]: Término no interpretado '{search_term}'.")
+        _GetTravelRequestsArgsSchema(search_term=search_term)
+    except ValidationError as e:
+        return f"Error en la herramienta: {_validation_error_message(e)}"
+
+    try:
+        statuses = _resolve_search_statuses(search_term)
+        if not statuses:
+             _get_requests_log.info("Término no interpretado", search_term=search_term)
              return f"No pude interpretar el término de búsqueda de estado: '{search_term}'."
 
-        where_clause = " OR ".join(status_conditions)
-        # Seleccionamos campos para la tabla
-        query = f"""
-            SELECT request_id, employee_first_name, employee_last_name, 
-                   destination_city, start_date, end_date, status
-            FROM `{table_ref_str}` WHERE {where_clause} ORDER BY timestamp DESC LIMIT 10
-        """
-        job_config = bigquery.QueryJobConfig(query_parameters=query_params)
-        query_job = client.query(query, job_config=job_config)
-        results = query_job.result()
+        results = _replica.query_by_statuses(statuses, limit=10) if _replica else None
+        if results is None: # Réplica desactivada o demasiado antigua
+            results = _get_rows_by_statuses_from_bq(statuses)
 
-        if results.total_rows == 0:
-            print(f"[LOG get_travel_requests_by_status]: No se encontraron solicitudes para '{search_term}'.")
+        if not results:
+            _get_requests_log.info("No se encontraron solicitudes", search_term=search_term)
             return f"No se encontraron solicitudes de viaje para el término: '{search_term}'."
 
         headers = ["ID Solicitud", "Empleado", "Destino", "Inicio", "Fin", "Estado"]
-        table_md = f"Se encontraron {results.total_rows} solicitudes para '{search_term}':\n\n"
+        table_md = f"Se encontraron {len(results)} solicitudes para '{search_term}':\n\n"
         table_md += "| " + " | ".join(headers) + " |\n"
         table_md += "| " + " | ".join(["---"] * len(headers)) + " |\n"
 
@@ -271,14 +367,15 @@ def get_travel_requests_by_status(search_term: str) -> str:
             ]
             table_md += "| " + " | ".join(row_data) + " |\n"
         
-        print(f"[LOG DE HERRAMIENTA get_travel_requests_by_status]: Tabla Markdown generada.")
+        _get_requests_log.info("Tabla Markdown generada", search_term=search_term, rows=len(results))
         return table_md
 
     except Exception as e:
-        print(f"[LOG DE HERRAMIENTA get_travel_requests_by_status - ERROR]: {e}")
+        _get_requests_log.error("Error técnico al consultar", exc_info=True, search_term=search_term)
         return f"Error técnico al consultar las solicitudes de viaje: {e}."
 
 # --- Lógica de la Herramienta 3: Actualizar Estado de Solicitud ---
+@profiled_tool
 def update_travel_request_status(request_id: str, new_status: str) -> str:
     """Actualiza el estado de una solicitud de viaje específica en BigQuery.
 
@@ -289,38 +386,22 @@ def update_travel_request_status(request_id: str, new_status: str) -> str:
     Returns:
         str: Mensaje de confirmación o error.
     """
-    valid_statuses = ["Registrada", "Pendiente de Aprobación", "Aprobada", "Rechazada", "Reservada", "Completada", "Cancelada"]
-    capitalized_new_status = new_status.strip().capitalize()
-    
-    if "pendiente de aprobaci" in new_status.lower():
-        capitalized_new_status = "Pendiente de Aprobación"
-    elif "registrada" in new_status.lower():
-        capitalized_new_status = "Registrada"
-    elif "aprobada" in new_status.lower():
-        capitalized_new_status = "Aprobada"
-    elif "rechazada" in new_status.lower():
-        capitalized_new_status = "Rechazada"
-    elif "reservada" in new_status.lower():
-        capitalized_new_status = "Reservada"
-    elif "completada" in new_status.lower():
-        capitalized_new_status = "Completada"
-    elif "cancelada" in new_status.lower():
-        capitalized_new_status = "Cancelada"
-
-    if capitalized_new_status not in valid_statuses:
-        return f"Error: '{new_status}' (como '{capitalized_new_status}') no es un estado válido. Válidos: {', '.join(valid_statuses)}."
+    try:
+        args = _UpdateTravelRequestArgsSchema(request_id=request_id, new_status=new_status)
+    except ValidationError as e:
+        return f"Error en la herramienta: {_validation_error_message(e)}"
+    new_status = args.new_status # Valor canónico del enum de estados
 
     try:
-        client = bigquery.Client()
-        table_ref_str = f"{BIGQUERY_PROJECT_ID}.{BIGQUERY_DATASET_ID}.{BIGQUERY_TABLE_ID}"
+        client = _get_bq_client()
         query = f"""
-            UPDATE `{table_ref_str}`
+            UPDATE `{TABLE_REF_STR}`
             SET status = @new_status_param, timestamp = @current_timestamp_param 
             WHERE request_id = @request_id_param 
         """
         job_config = bigquery.QueryJobConfig(
             query_parameters=[
-                bigquery.ScalarQueryParameter("new_status_param", "STRING", capitalized_new_status),
+                bigquery.ScalarQueryParameter("new_status_param", "STRING", new_status),
                 bigquery.ScalarQueryParameter("request_id_param", "STRING", request_id),
                 bigquery.ScalarQueryParameter("current_timestamp_param", "TIMESTAMP", datetime.datetime.now(datetime.timezone.utc).isoformat())
             ]
@@ -329,28 +410,78 @@ def update_travel_request_status(request_id: str, new_status: str) -> str:
         query_job.result()
 
         if query_job.num_dml_affected_rows is not None and query_job.num_dml_affected_rows > 0:
-            success_message = f"Solicitud ID '{request_id}' actualizada a '{capitalized_new_status}'."
-            print(f"[LOG update_travel_request_status]: {success_message}")
+            success_message = f"Solicitud ID '{request_id}' actualizada a '{new_status}'."
+            _update_log.info("Estado actualizado", request_id=request_id, new_status=new_status)
+            if _replica:
+                _replica.invalidate() # La siguiente consulta debe ver el nuevo estado
             return success_message
         else:
-            not_found_message = f"No se encontró solicitud ID '{request_id}' o el estado ya era '{capitalized_new_status}'."
-            print(f"[LOG update_travel_request_status]: {not_found_message}")
+            not_found_message = f"No se encontró solicitud ID '{request_id}' o el estado ya era '{new_status}'."
+            _update_log.info("Sin cambios: solicitud no encontrada o mismo estado", request_id=request_id, new_status=new_status)
             return not_found_message
     except Exception as e:
         error_message = f"Error técnico al actualizar estado de '{request_id}': {e}"
-        print(f"[LOG update_travel_request_status - ERROR]: {error_message}")
+        _update_log.error("Error técnico al actualizar estado", exc_info=True, request_id=request_id)
         return error_message
 
+# --- Lógica de la Herramienta 4: Estadísticas de Viajes (Arrow, agregados en proceso) ---
+@profiled_tool
+def get_travel_analytics(
+    destination_city: Optional[str] = None,
+    transport_mode: Optional[str] = None,
+    status: Optional[str] = None,
+    start_date_from: Optional[str] = None,
+    start_date_to: Optional[str] = None
+) -> str:
+    """Calcula estadísticas de solicitudes de viaje: número de viajes, días totales y medios,
+    y desgloses por destino, medio de transporte y estado. Todos los filtros son opcionales.
+
+    Args:
+        destination_city (str, optional): Ciudad de destino (ej. 'Madrid').
+        transport_mode (str, optional): Medio de transporte (Avión, Tren, Autobús, Coche).
+        status (str, optional): Estado de la solicitud (ej. 'Aprobada'). Si se omite, no se cuentan
+            las solicitudes Rechazadas ni Canceladas.
+        start_date_from (str, optional): Solo viajes que empiezan en esta fecha o después,<y_bin_46>MM-DD.
+        start_date_to (str, optional): Solo viajes que empiezan en esta fecha o antes,<y_bin_46>MM-DD.
+
+    Returns:
+        str: Resumen compacto de los agregados o un mensaje de error.
+    """
+    try:
+        filters = _TravelAnalyticsArgsSchema(
+            destination_city=destination_city, transport_mode=transport_mode, status=status,
+            start_date_from=start_date_from, start_date_to=start_date_to).model_dump()
+    except ValidationError as e:
+        return f"Error en la herramienta: {_validation_error_message(e)}"
+
+    try:
+        # Importación diferida: pyarrow (y google-cloud-bigquery-storage) solo los necesita esta
+        # herramienta; si faltan en el despliegue del agente, el resto de herramientas sigue funcionando.
+        from .travel_analytics import fetch_travel_table, format_summary, summarize_travel_table
+    except ImportError as e:
+        _analytics_log.error("Dependencias de análisis no disponibles", exc_info=True)
+        return f"Error técnico: la herramienta de estadísticas no está disponible en este despliegue ({e})."
+
+    try:
+        table = fetch_travel_table(_get_bq_client(), TABLE_REF_STR, **filters)
+        summary_text = format_summary(summarize_travel_table(table), filters)
+        _analytics_log.info("Estadísticas calculadas", filters=filters, rows=table.num_rows)
+        return summary_text
+    except Exception as e:
+        _analytics_log.error("Error técnico al calcular estadísticas", exc_info=True, filters=filters)
+        return f"Error técnico al calcular las estadísticas de viajes: {e}."
+
 # --- Definición del Agente ---
 company_travel_agent = LlmAgent(
     name="CompanyTravelAgent",
-    description="Agente para gestionar solicitudes de viaje: registrar, consultar y actualizar estados en BigQuery.",
+    description="Agente para gestionar solicitudes de viaje: registrar, consultar, actualizar estados y calcular estadísticas en BigQuery.",
     instruction=TRAVEL_AGENT_INSTRUCTION,
     model=MODEL_ID,
     tools=[
         request_travel_booking_logic,
         get_travel_requests_by_status,
-        update_travel_request_status
+        update_travel_request_status,
+        get_travel_analytics
     ]
 )
 
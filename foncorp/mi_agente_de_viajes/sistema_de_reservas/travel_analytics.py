@@ -0,0 +1,137 @@
+# travel_analytics.py
+# Agregados sobre travel_requests calculados en proceso con Arrow, para responder preguntas
+# como "¿cuántos viajes a Madrid en tren este trimestre y cuántos días en total?" sin volcar
+# filas al contexto del LLM. Los filtros se empujan a BigQuery (WHERE) y solo se leen las
+# columnas necesarias; el resultado llega como Arrow (Storage Read API si está instalada
+# google-cloud-bigquery-storage) y los agregados se calculan de forma vectorizada con
+# pyarrow.compute. Este fichero se copia tal cual en la Cloud Function analizar-viajes-tool y
+# en el paquete del agente: mantener las copias idénticas.
+from typing import Any, Dict, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+from google.cloud import bigquery
+
+ANALYTICS_COLUMNS = ["destination_city", "transport_mode", "status", "start_date", "end_date"]
+BREAKDOWN_COLUMNS = ["destination_city", "transport_mode", "status"]
+MAX_BREAKDOWN_ITEMS = 10 # Mantener la respuesta compacta: solo los grupos más frecuentes (el resto, en "otros")
+# Sin filtro de estado, las solicitudes rechazadas o canceladas no son viajes: no se cuentan.
+EXCLUDED_STATUSES_BY_DEFAULT = ["Rechazada", "Cancelada"]
+
+
+def build_analytics_query(
+    table_ref: str,
+    destination_city: Optional[str] = None,
+    transport_mode: Optional[str] = None,
+    status: Optional[str] = None,
+    start_date_from: Optional[str] = None,
+    start_date_to: Optional[str] = None,
+) -> Tuple[str, List[Any]]:
+    """Construye la SELECT filtrada (solo ANALYTICS_COLUMNS) y sus parámetros.
+    Si no se pide un estado concreto se excluyen EXCLUDED_STATUSES_BY_DEFAULT.
+    """
+    conditions = []
+    params: List[Any] = []
+    for column, value in (("destination_city", destination_city), ("transport_mode", transport_mode), ("status", status)):
+        if value:
+            conditions.append(f"LOWER({column}) = LOWER(@{column})")
+            params.append(bigquery.ScalarQueryParameter(column, "STRING", value))
+    if not status:
+        conditions.append("(status IS NULL OR LOWER(status) NOT IN UNNEST(@excluded_statuses))")
+        params.append(bigquery.ArrayQueryParameter(
+            "excluded_statuses", "STRING", [s.lower() for s in EXCLUDED_STATUSES_BY_DEFAULT]))
+    if start_date_from:
+        conditions.append("start_date >= @start_date_from")
+        params.append(bigquery.ScalarQueryParameter("start_date_from", "DATE", start_date_from))
+    if start_date_to:
+        conditions.append("start_date <= @start_date_to")
+        params.append(bigquery.ScalarQueryParameter("start_date_to", "DATE", start_date_to))
+    where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    query = f"SELECT {', '.join(ANALYTICS_COLUMNS)} FROM `{table_ref}` {where_clause}"
+    return query, params
+
+
+def fetch_travel_table(client: bigquery.Client, table_ref: str, **filters: Optional[str]) -> pa.Table:
+    """Ejecuta la consulta filtrada y devuelve el resultado como tabla Arrow."""
+    query, params = build_analytics_query(table_ref, **filters)
+    query_job = client.query(query, job_config=bigquery.QueryJobConfig(query_parameters=params))
+    # create_bqstorage_client usa la Storage Read API si está disponible y si no cae a la API REST.
+    return query_job.result().to_arrow(create_bqstorage_client=True)
+
+
+def _breakdown(table: pa.Table, column: str) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, int]]]:
+    """Desglose por column: (grupos más frecuentes, resto agregado o None si no hay resto).
+    Se agrupa sin distinguir mayúsculas ni espacios, igual que filtran las consultas
+    (destination_city es texto libre), y cada grupo se muestra con su variante menor
+    ('Madrid' antes que 'madrid').
+    """
+    trimmed = pc.utf8_trim_whitespace(table[column])
+    keyed = table.select(["trip_days"]).append_column("label", trimmed).append_column("group_key", pc.utf8_lower(trimmed))
+    # count_all cuenta filas, igual que trip_count
+    grouped = keyed.group_by("group_key").aggregate([([], "count_all"), ("trip_days", "sum"), ("label", "min")])
+    grouped = grouped.sort_by([("count_all", "descending")])
+    items = [
+        {"value": value, "trips": trips, "trip_days": days or 0}
+        for value, trips, days in zip(
+            grouped["label_min"].to_pylist(),
+            grouped["count_all"].to_pylist(),
+            grouped["trip_days_sum"].to_pylist(),
+        )
+    ]
+    rest = items[MAX_BREAKDOWN_ITEMS:]
+    others = None
+    if rest:
+        others = {
+            "groups": len(rest),
+            "trips": sum(item["trips"] for item in rest),
+            "trip_days": sum(item["trip_days"] for item in rest),
+        }
+    return items[:MAX_BREAKDOWN_ITEMS], others
+
+
+def summarize_travel_table(table: pa.Table) -> Dict[str, Any]:
+    """Calcula número de viajes, días totales y medios (fin - inicio + 1, ambos incluidos)
+    y los desgloses por destino, medio de transporte y estado. Cada desglose by_<columna> va
+    acompañado de by_<columna>_others con los grupos que no caben (None si no hay), de modo
+    que los viajes de un desglose siempre suman trip_count.
+    Los viajes sin alguna de las fechas, o con la vuelta anterior a la ida (datos erróneos),
+    cuentan como viaje pero no suman días.
+    """
+    trip_days = pc.add(pc.days_between(table["start_date"], table["end_date"]), 1)
+    trip_days = pc.if_else(pc.less(trip_days, 1), pa.scalar(None, trip_days.type), trip_days)
+    table = table.append_column("trip_days", trip_days)
+    total_days = pc.sum(trip_days).as_py()
+    avg_days = pc.mean(trip_days).as_py()
+    summary: Dict[str, Any] = {
+        "trip_count": table.num_rows,
+        "total_trip_days": total_days or 0,
+        "avg_trip_days": round(avg_days, 2) if avg_days is not None else None,
+    }
+    for column in BREAKDOWN_COLUMNS:
+        summary[f"by_{column}"], summary[f"by_{column}_others"] = _breakdown(table, column) if table.num_rows else ([], None)
+    return summary
+
+
+def format_summary(summary: Dict[str, Any], filters: Dict[str, Optional[str]]) -> str:
+    """Texto compacto para el LLM/Playbook a partir del resumen."""
+    applied = ", ".join(f"{k}={v}" for k, v in filters.items() if v) or "sin filtros"
+    if not filters.get("status"):
+        applied += f"; excluidas las solicitudes en estado {' o '.join(EXCLUDED_STATUSES_BY_DEFAULT)}"
+    if not summary["trip_count"]:
+        return f"No se encontraron viajes ({applied})."
+    lines = [
+        f"Viajes ({applied}): {summary['trip_count']}. "
+        f"Días totales: {summary['total_trip_days']}. Media de días por viaje: {summary['avg_trip_days']}."
+    ]
+    labels = {"destination_city": "Por destino", "transport_mode": "Por transporte", "status": "Por estado"}
+    for column in BREAKDOWN_COLUMNS:
+        items = [
+            f"{item['value'] or 'N/A'}: {item['trips']} viajes, {item['trip_days']} días"
+            for item in summary[f"by_{column}"]
+        ]
+        others = summary[f"by_{column}_others"]
+        if others:
+            items.append(f"otros ({others['groups']} más): {others['trips']} viajes, {others['trip_days']} días")
+        items = "; ".join(items)
+        lines.append(f"{labels[column]}: {items}.")
+    return "\n".join(lines)